@@ -0,0 +1,161 @@
+"""Micro-benchmark: ScreenshotClassifier vs the original detect_action/extract_datetime/location probes.
+
+    python bench-classify.py --texts output_texts --repeat 5
+
+Without OCR text files a synthetic corpus is generated from gta-locations.py.
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import re
+import time
+
+from rapidfuzz import fuzz
+
+
+# === ORIGINAL IMPLEMENTATIONS (reference) ===
+# name patterns carry the lazy \D+? fix, so agreement measures the classifier rewrite only
+def legacy_detect_action(text):
+    for line in text.splitlines():
+        l = line.lower()
+        if fuzz.partial_ratio("вы вылечили", l) > 80:
+            match = re.search(r"выл[её]чили\D+?([A-Za-zА-Яа-яЁё0-9_ ]{3,40})", line, re.IGNORECASE)
+            if match:
+                name = match.group(1).strip()
+                if 1 <= len(name.split()) <= 2:
+                    return "heal", name
+        elif fuzz.partial_ratio("вы вакцинировали", l) > 80:
+            match = re.search(r"вакцинировали\D+?([A-Za-zА-Яа-яЁё0-9_ ]{3,40})", line, re.IGNORECASE)
+            if match:
+                name = match.group(1).strip()
+                if 1 <= len(name.split()) <= 2:
+                    return "vaccine", name
+        elif fuzz.partial_ratio("вы реанимировали", l) > 80:
+            match = re.search(r"реанимировали\D+?([A-Za-zА-Яа-яЁё0-9_ ]{3,40})", line, re.IGNORECASE)
+            if match:
+                name = match.group(1).strip()
+                if 1 <= len(name.split()) <= 2:
+                    return "reanimation", name
+    return None, None
+
+
+def legacy_extract_datetime(text):
+    pattern = r'(\d{1,2})[.:](\d{2})\s+(\d{2})[.\-/]?(\d{2})[.\-/]?(\d{4})'
+    match = re.search(pattern, text)
+    if match:
+        h, m, d, mo, y = match.groups()
+        hour = int(h)
+        time_of_day = "Day" if 12 <= hour < 22 else "Night"
+        full = f"{h.zfill(2)}:{m} {d.zfill(2)}.{mo.zfill(2)}.{y}"
+        return full, time_of_day
+    return None, None
+
+
+def legacy_find_location(text, location_map):
+    for line in text.splitlines():
+        for loc_name in location_map:
+            if fuzz.partial_ratio(loc_name.lower(), line.lower()) > 85:
+                return location_map[loc_name]
+    return None
+
+
+def legacy_classify(text, simple_map, reanimation_map):
+    action, name = legacy_detect_action(text)
+    dt_full, time_of_day = legacy_extract_datetime(text)
+    folder = None
+    if action == "reanimation":
+        folder = legacy_find_location(text, reanimation_map)
+    elif action:
+        folder = legacy_find_location(text, simple_map)
+    return action, name, dt_full, time_of_day, folder
+
+
+# === CORPUS ===
+def load_corpus(text_folder):
+    """Texts from the folder's ocr.jsonl store (last record per screenshot) and its .txt files."""
+    texts = {}
+    if text_folder and os.path.isdir(text_folder):
+        for entry in os.scandir(text_folder):
+            if entry.name.lower().endswith('.txt'):
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    texts[os.path.splitext(entry.name)[0]] = f.read()
+        store_path = os.path.join(text_folder, 'ocr.jsonl')
+        if os.path.exists(store_path):
+            with open(store_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    texts[record['stem']] = '\n'.join(l['text'] for l in record['lines'])
+    return list(texts.values())
+
+
+def synthetic_corpus(location_names, size, seed=0):
+    rnd = random.Random(seed)
+    phrases = ["Вы вылечили", "Вы вакцинировали", "Вы реанимировали", "Вы пoлучили", "Игрок"]
+    people = ["Ivan Petrov", "John_Smith", "Anna Volkova", "Max", "Dmitry Orlov"]
+    chatter = ["[OOC] кто на тренировку?", "Сервер перезагрузится через 10 минут", "/me достал аптечку",
+               "Вы получили $250", "Добро пожаловать на Majestic RP"]
+    corpus = []
+    for _ in range(size):
+        lines = rnd.sample(chatter, 3)
+        lines.insert(rnd.randrange(len(lines) + 1), f"{rnd.choice(phrases)} {rnd.choice(people)}")
+        lines.append(rnd.choice(location_names))
+        lines.append(f"{rnd.randrange(24):02d}:{rnd.randrange(60):02d} {rnd.randrange(1, 29):02d}.{rnd.randrange(1, 13):02d}.2025")
+        corpus.append('\n'.join(lines))
+    return corpus
+
+
+def timed(fn, corpus, repeat):
+    best = float('inf')
+    results = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [fn(text) for text in corpus]
+        best = min(best, time.perf_counter() - start)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the screenshot text classifier.")
+    parser.add_argument('--texts', default='output_texts', help='Folder with OCR output (ocr.jsonl or .txt files)')
+    parser.add_argument('--location-py', default='gta-locations.py', help='Location path')
+    parser.add_argument('--synthetic', type=int, default=2000, help='Synthetic corpus size when --texts is empty')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions, best time is reported')
+    args = parser.parse_args()
+
+    ocr = importlib.import_module('ocr-merged')  # the script's folder is on sys.path
+    reanimation_map = ocr.load_location_map(args.location_py)
+    corpus = load_corpus(args.texts)
+    source = args.texts
+    if not corpus:
+        corpus = synthetic_corpus(list(reanimation_map) + list(ocr.LOCATION_MAP), args.synthetic)
+        source = 'synthetic'
+    print(f"Corpus: {len(corpus)} texts ({source})")
+
+    classifier = ocr.ScreenshotClassifier(ocr.LocationMatcher(reanimation_map))
+
+    def new(text):
+        r = classifier.classify(text)
+        return r.action, r.name, r.datetime, r.time_of_day, r.location_folder
+
+    def old(text):
+        return legacy_classify(text, ocr.LOCATION_MAP, reanimation_map)
+
+    old_time, old_results = timed(old, corpus, args.repeat)
+    new_time, new_results = timed(new, corpus, args.repeat)
+    n = len(corpus)
+    print(f"original:   {old_time:.3f}s  ({old_time / n * 1e6:.0f} us/text)")
+    print(f"classifier: {new_time:.3f}s  ({new_time / n * 1e6:.0f} us/text)")
+    print(f"speedup:    x{old_time / new_time:.1f}")
+    fields = ['action', 'name', 'datetime', 'time_of_day', 'location']
+    for i, field in enumerate(fields):
+        same = sum(1 for a, b in zip(old_results, new_results) if a[i] == b[i])
+        print(f"agreement {field:<12} {same}/{n}")
+
+
+if __name__ == "__main__":
+    main()
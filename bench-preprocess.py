@@ -0,0 +1,98 @@
+"""Preprocessing presets: OCR time vs classification accuracy on a labeled sample set.
+
+    python bench-preprocess.py --samples samples --presets none,gray,fast,chat-binarize
+
+The sample folder holds screenshots plus labels.jsonl, one object per screenshot:
+
+    {"image": "Screenshot_1.png", "action": "heal", "name": "Ivan Petrov",
+     "datetime": "21:04 12.05.2025", "location_folder": "Sandy-Shores"}
+
+Only the fields present in a label are scored.
+"""
+import argparse
+import importlib
+import json
+import os
+import statistics
+import time
+
+FIELDS = ['action', 'name', 'datetime', 'location_folder']
+
+
+def load_labels(samples_dir, labels_path):
+    labels = []
+    with open(labels_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                label = json.loads(line)
+                label['path'] = os.path.join(samples_dir, label['image'])
+                labels.append(label)
+    return labels
+
+
+def run_preset(ocr, reader, classifier, labels, preset, roi_profile, profiles):
+    times = []
+    correct = {field: 0 for field in FIELDS}
+    scored = {field: 0 for field in FIELDS}
+    all_correct = 0
+    for label in labels:
+        start = time.perf_counter()
+        results = ocr.ocr_image(reader, label['path'], roi_profile, profiles, preset)
+        times.append(time.perf_counter() - start)
+        result = classifier.classify('\n'.join(text for _, text, _ in results))
+        ok = True
+        for field in FIELDS:
+            if field not in label:
+                continue
+            scored[field] += 1
+            if getattr(result, field) == label[field]:
+                correct[field] += 1
+            else:
+                ok = False
+        all_correct += ok
+    return times, correct, scored, all_correct
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OCR preprocessing presets on labeled screenshots.")
+    parser.add_argument('--samples', default='samples', help='Folder with labeled screenshots')
+    parser.add_argument('--labels', default=None, help='Labels file (default: <samples>/labels.jsonl)')
+    parser.add_argument('--location-py', default='gta-locations.py', help='Location path')
+    parser.add_argument('--presets', default=None, help='Comma-separated presets (default: all)')
+    parser.add_argument('--preprocess-config', default=None, help='JSON file with extra preprocessing presets')
+    parser.add_argument('--roi-profile', default='auto', help="ROI profile name, 'auto' or 'off'")
+    parser.add_argument('--roi-config', default=None, help='JSON file with extra ROI profiles')
+    parser.add_argument('--ocr-backend', default='easyocr', help='easyocr, tesseract or cascade')
+    parser.add_argument('--tesseract-cmd', default=None, help='Path to the tesseract executable if not in PATH')
+    args = parser.parse_args()
+
+    ocr = importlib.import_module('ocr-merged')  # the script's folder is on sys.path
+    labels = load_labels(args.samples, args.labels or os.path.join(args.samples, 'labels.jsonl'))
+    if not labels:
+        parser.error(f"No labeled screenshots in {args.labels or os.path.join(args.samples, 'labels.jsonl')}")
+    presets = ocr.load_preprocess_presets(args.preprocess_config)
+    names = args.presets.split(',') if args.presets else list(presets)
+    profiles = ocr.load_roi_profiles(args.roi_config)
+    classifier = ocr.ScreenshotClassifier(ocr.LocationMatcher(ocr.load_location_map(args.location_py)))
+    reader = ocr.create_backend(args.ocr_backend, tesseract_cmd=args.tesseract_cmd)
+    # first call pays for lazy model init, keep it out of the numbers
+    ocr.ocr_image(reader, labels[0]['path'], args.roi_profile, profiles)
+
+    print(f"Samples: {len(labels)} ({args.samples}), backend: {reader.version()}")
+    header = f"{'preset':<16} {'ms/img':>8} {'p90 ms':>8} " + ' '.join(f"{f[:10]:>10}" for f in FIELDS) + f" {'all':>7}"
+    print(header)
+    for name in names:
+        preset = ocr.resolve_preprocess(name, presets)
+        times, correct, scored, all_correct = run_preset(ocr, reader, classifier, labels, preset,
+                                                         args.roi_profile, profiles)
+        ms = [t * 1000 for t in times]
+        p90 = sorted(ms)[int(len(ms) * 0.9) - 1] if len(ms) >= 10 else max(ms)
+        accuracy = ' '.join(
+            f"{correct[f] / scored[f] * 100:>9.1f}%" if scored[f] else f"{'-':>10}" for f in FIELDS
+        )
+        print(f"{name:<16} {statistics.mean(ms):>8.0f} {p90:>8.0f} {accuracy} {all_correct / len(labels) * 100:>6.1f}%")
+
+
+if __name__ == "__main__":
+    main()
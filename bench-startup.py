@@ -0,0 +1,74 @@
+"""Startup-time benchmark for ocr-merged.py.
+
+    python bench-startup.py --repeat 5 [--with-reader]
+
+Times `--help`, a sort-only run on an empty folder and (optionally) the OCR model load,
+each in a fresh interpreter, and checks that the fast paths never import torch/easyocr.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(HERE, 'ocr-merged.py')
+
+HEAVY_MODULES_CHECK = f"""
+import importlib.util, sys
+spec = importlib.util.spec_from_file_location('ocr_merged', {SCRIPT!r})
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+heavy = [m for m in ('easyocr', 'torch', 'torchvision', 'scipy', 'skimage') if m in sys.modules]
+print(','.join(heavy))
+"""
+
+READER_LOAD = f"""
+import importlib.util
+spec = importlib.util.spec_from_file_location('ocr_merged', {SCRIPT!r})
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+module.create_backend().load()
+"""
+
+
+def run(cmd, cwd, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=cwd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ocr-merged.py startup paths.")
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per scenario')
+    parser.add_argument('--with-reader', action='store_true', help='Also time loading the easyocr Reader')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ('images', 'output_texts', 'output_images'):
+            os.makedirs(os.path.join(tmp, name))
+        scenarios = [
+            ('python (baseline)', [sys.executable, '-c', 'pass']),
+            ('--help', [sys.executable, SCRIPT, '--help']),
+            ('--skip-ocr, empty folder', [sys.executable, SCRIPT, '--skip-ocr',
+                                          '--location-py', os.path.join(HERE, 'gta-locations.py')]),
+        ]
+        if args.with_reader:
+            scenarios.append(('load easyocr backend', [sys.executable, '-c', READER_LOAD]))
+        print(f"{'scenario':<28} {'min':>8} {'median':>8}")
+        for name, cmd in scenarios:
+            times = run(cmd, tmp, args.repeat)
+            print(f"{name:<28} {min(times):>7.3f}s {statistics.median(times):>7.3f}s")
+
+        heavy = subprocess.run([sys.executable, '-c', HEAVY_MODULES_CHECK], cwd=tmp, check=True,
+                               capture_output=True, text=True).stdout.strip()
+        print(f"heavy modules after import: {heavy or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
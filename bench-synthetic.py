@@ -0,0 +1,196 @@
+"""Synthetic screenshot benchmark: OCR + classification speed and accuracy against known ground truth.
+
+    python bench-synthetic.py --count 200 --font C:\\Windows\\Fonts\\arial.ttf
+    python bench-synthetic.py --no-ocr          # classifier only, on the rendered strings
+
+Renders 1920x1080 GTA-style screenshots with PIL (chat overlay with an action line, HUD location,
+clock), then reports images/sec, per-stage latency, peak RSS and accuracy per category.
+--out keeps the screenshots and a labels.jsonl usable by bench-preprocess.py.
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WIDTH, HEIGHT = 1920, 1080
+FIELDS = ['action', 'name', 'datetime', 'location_folder']
+CATEGORIES = ['heal', 'vaccine', 'reanimation', 'various']
+ACTION_PHRASES = {'heal': 'Вы вылечили', 'vaccine': 'Вы вакцинировали', 'reanimation': 'Вы реанимировали'}
+PEOPLE = ['Ivan Petrov', 'John_Smith', 'Anna Volkova', 'Max', 'Dmitry Orlov', 'Kate Morozova', 'Tony_Rossi']
+CHATTER = ['[OOC] кто на тренировку?', 'Сервер перезагрузится через 10 минут', '/me достал аптечку',
+           'Вы получили $250', 'Добро пожаловать на Majestic RP', 'Игрок Max_Payne вышел из игры',
+           '[Рация] 10-4, выезжаем', 'Вы оплатили штраф $500']
+# formats DATETIME_PATTERN accepts: "H:MM DD.MM.YYYY", "H.MM DD-MM-YYYY", "H:MM DD/MM/YYYY", "H:MM DDMMYYYY"
+DATETIME_FORMATS = ['{h}:{m} {d}.{mo}.{y}', '{h}.{m} {d}-{mo}-{y}', '{h}:{m} {d}/{mo}/{y}', '{h}:{m} {d}{mo}{y}']
+FONT_CANDIDATES = [
+    'C:\\Windows\\Fonts\\arial.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/System/Library/Fonts/Supplemental/Arial.ttf',
+]
+
+
+def load_font(path, size):
+    from PIL import ImageFont
+    for candidate in [path] if path else FONT_CANDIDATES:
+        if candidate and os.path.exists(candidate):
+            return ImageFont.truetype(candidate, size)
+    print("[!] No TrueType font with Cyrillic found, pass --font; Cyrillic text will not render")
+    return ImageFont.load_default(size)
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+# === GENERATOR ===
+def make_sample(rnd, index, simple_map, reanimation_map):
+    """Ground truth and the text lines of one screenshot."""
+    category = rnd.choice(CATEGORIES)
+    h, m = rnd.randrange(24), rnd.randrange(60)
+    d, mo, y = rnd.randrange(1, 29), rnd.randrange(1, 13), rnd.choice([2024, 2025])
+    stamp = rnd.choice(DATETIME_FORMATS).format(h=h, m=f"{m:02d}", d=f"{d:02d}", mo=f"{mo:02d}", y=y)
+    label = {
+        'image': f"synthetic_{index:05d}.png",
+        'category': category,
+        'action': None,
+        'name': None,
+        'datetime': f"{h:02d}:{m:02d} {d:02d}.{mo:02d}.{y}",
+    }
+    chat = rnd.sample(CHATTER, rnd.randrange(2, 5))
+    if category == 'reanimation':
+        location = rnd.choice(list(reanimation_map))
+        label['location_folder'] = reanimation_map[location]
+    else:
+        location = rnd.choice(list(simple_map))
+        label['location_folder'] = simple_map[location] if category != 'various' else None
+    if category != 'various':
+        person = rnd.choice(PEOPLE)
+        label['action'], label['name'] = category, person
+        chat.insert(rnd.randrange(len(chat) + 1), f"{ACTION_PHRASES[category]} {person}")
+    return label, {'chat': chat, 'location': location, 'clock': stamp}
+
+
+def render(texts, fonts, rnd):
+    from PIL import Image, ImageDraw
+    top = tuple(rnd.randrange(40, 160) for _ in range(3))
+    bottom = tuple(rnd.randrange(20, 120) for _ in range(3))
+    image = Image.linear_gradient('L').resize((WIDTH, HEIGHT))
+    image = Image.merge('RGB', [image.point(lambda v, a=a, b=b: a + (b - a) * v // 255) for a, b in zip(top, bottom)])
+    draw = ImageDraw.Draw(image, 'RGBA')
+    for _ in range(12):  # scenery
+        x, y = rnd.randrange(WIDTH), rnd.randrange(HEIGHT)
+        draw.rectangle((x, y, x + rnd.randrange(40, 400), y + rnd.randrange(40, 300)),
+                       fill=tuple(rnd.randrange(256) for _ in range(3)) + (160,))
+    draw.rectangle((10, 10, 740, 30 + 30 * len(texts['chat'])), fill=(0, 0, 0, 110))
+    for i, line in enumerate(texts['chat']):
+        draw.text((20, 20 + 30 * i), line, font=fonts['chat'], fill=(255, 255, 255), stroke_width=1, stroke_fill=(0, 0, 0))
+    draw.text((30, 960), texts['location'], font=fonts['location'], fill=(255, 255, 255), stroke_width=2, stroke_fill=(0, 0, 0))
+    draw.text((1580, 40), texts['clock'], font=fonts['clock'], fill=(255, 255, 255), stroke_width=2, stroke_fill=(0, 0, 0))
+    return image
+
+
+# === RUN ===
+def main():
+    parser = argparse.ArgumentParser(description="Render synthetic screenshots and benchmark OCR + classification.")
+    parser.add_argument('--count', type=int, default=100, help='Number of screenshots')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--font', default=None, help='TrueType font with Cyrillic glyphs')
+    parser.add_argument('--out', default=None, help='Keep the screenshots and labels.jsonl in this folder')
+    parser.add_argument('--location-py', default=os.path.join(HERE, 'gta-locations.py'), help='Location path')
+    parser.add_argument('--no-ocr', action='store_true', help='Classify the rendered strings, skip OCR')
+    parser.add_argument('--ocr-backend', default='easyocr', help='easyocr, tesseract or cascade')
+    parser.add_argument('--tesseract-cmd', default=None, help='Path to the tesseract executable if not in PATH')
+    parser.add_argument('--roi-profile', default='auto', help="ROI profile name, 'auto' or 'off'")
+    parser.add_argument('--preprocess', default='none', help='Preprocessing preset')
+    args = parser.parse_args()
+
+    ocr = importlib.import_module('ocr-merged')  # the script's folder is on sys.path
+    reanimation_map = ocr.load_location_map(args.location_py)
+    classifier = ocr.ScreenshotClassifier(ocr.LocationMatcher(reanimation_map))
+    rnd = random.Random(args.seed)
+    samples = [make_sample(rnd, i, ocr.LOCATION_MAP, reanimation_map) for i in range(args.count)]
+
+    tmp = None
+    out = args.out
+    if out is None and not args.no_ocr:
+        tmp = tempfile.TemporaryDirectory()
+        out = tmp.name
+    if out:
+        os.makedirs(out, exist_ok=True)
+        fonts = {'chat': load_font(args.font, 22), 'location': load_font(args.font, 30), 'clock': load_font(args.font, 28)}
+        with open(os.path.join(out, 'labels.jsonl'), 'w', encoding='utf-8') as f:
+            for label, texts in samples:
+                render(texts, fonts, rnd).save(os.path.join(out, label['image']))
+                f.write(json.dumps(label, ensure_ascii=False) + '\n')
+        print(f"Rendered {len(samples)} screenshots to {out}")
+
+    stages = {'decode': [], 'ocr': [], 'classify': []}
+    reader, profiles, preset = None, None, None
+    if not args.no_ocr:
+        reader = ocr.create_backend(args.ocr_backend, tesseract_cmd=args.tesseract_cmd).load()
+        profiles = ocr.load_roi_profiles()
+        preset = ocr.resolve_preprocess(args.preprocess)
+    results = []
+    started = time.perf_counter()
+    for label, texts in samples:
+        if args.no_ocr:
+            lines = texts['chat'] + [texts['location'], texts['clock']]
+        else:
+            path = os.path.join(out, label['image'])
+            t0 = time.perf_counter()
+            image = ocr.load_image(path)
+            t1 = time.perf_counter()
+            lines = [text for _, text, _ in ocr.ocr_image(reader, path, args.roi_profile, profiles, preset, image=image)]
+            t2 = time.perf_counter()
+            stages['decode'].append(t1 - t0)
+            stages['ocr'].append(t2 - t1)
+        t0 = time.perf_counter()
+        results.append(classifier.classify('\n'.join(lines)))
+        stages['classify'].append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    mode = 'classifier only' if args.no_ocr else f"{reader.version()}, preprocess {args.preprocess}"
+    print(f"Mode: {mode}")
+    print(f"Throughput: {len(samples) / elapsed:.2f} images/sec ({elapsed:.2f}s for {len(samples)})")
+    print(f"{'stage':<10} {'mean ms':>9} {'p50 ms':>9} {'max ms':>9}")
+    for stage, times in stages.items():
+        if times:
+            ms = [t * 1000 for t in times]
+            print(f"{stage:<10} {statistics.mean(ms):>9.2f} {statistics.median(ms):>9.2f} {max(ms):>9.2f}")
+    rss = peak_rss_mb()
+    print(f"Peak RSS: {rss:.0f} MB" if rss is not None else "Peak RSS: n/a (install psutil)")
+
+    print(f"\n{'category':<12} {'n':>4} " + ' '.join(f"{f[:10]:>10}" for f in FIELDS) + f" {'all':>7}")
+    for category in CATEGORIES:
+        pairs = [(label, result) for (label, _), result in zip(samples, results) if label['category'] == category]
+        if not pairs:
+            continue
+        row = []
+        for field in FIELDS:
+            correct = sum(1 for label, result in pairs if getattr(result, field) == label[field])
+            row.append(f"{correct / len(pairs) * 100:>9.1f}%")
+        exact = sum(1 for label, result in pairs if all(getattr(result, f) == label[f] for f in FIELDS))
+        print(f"{category:<12} {len(pairs):>4} {' '.join(row)} {exact / len(pairs) * 100:>6.1f}%")
+    if tmp is not None:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
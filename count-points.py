@@ -1,13 +1,11 @@
 import argparse
+import hashlib
+import json
+import math
 import os
+from dataclasses import dataclass, field
+from typing import List, Optional
 
-parser = argparse.ArgumentParser()
-parser.add_argument('--target-score', type=int, help='Target total score')
-args = parser.parse_args()
-
-o = open('report.txt','w', encoding="utf-8")
-
-# TODO gui???
 main_folder_path = 'output_images'
 
 folders = ['heal', 'reanimation', 'vaccine']
@@ -35,104 +33,365 @@ reanimation_scores = {
     ('NotCity', 'Night'): 6,
 }
 
-total_score = 0
-reanimation_score = 0
-detailed_report = []
+target_percentage = 70
+
+
+def scoring_rules():
+    """(category, folder relative to the output root, label, points per screenshot), in report order."""
+    rules = []
+    for category in ['heal', 'vaccine']:
+        for loc in locations:
+            per_file_score = (heal_scores if category == 'heal' else vaccine_scores)[loc]
+            rules.append((category, f"{category}/{loc}", f"{category.capitalize()} – {loc}", per_file_score))
+    for loc in reanimation_locations:
+        for time in timestamp:
+            rules.append(('reanimation', f"reanimation/{loc}/{time}", f"Reanimation – {loc}/{time}",
+                          reanimation_scores.get((loc, time), 0)))
+    return rules
+
+
+# === COUNTING ===
+def load_manifest_hashes(main_folder_path):
+    """dest -> (image size, image sha256) from manifest.jsonl written by ocr-merged.py, empty without one."""
+    manifest_path = os.path.join(main_folder_path, 'manifest.jsonl')
+    hashes = {}
+    if not os.path.exists(manifest_path):
+        return hashes
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('dest') and record.get('image_hash'):
+                hashes[record['dest']] = (record.get('image_size'), record['image_hash'])
+    return hashes
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def scan_files(main_folder_path):
+    """Files per output folder from one os.scandir walk of the output tree."""
+    files = {}
+    stack = ['']
+    while stack:
+        rel = stack.pop()
+        try:
+            it = os.scandir(os.path.join(main_folder_path, rel))
+        except OSError:
+            continue
+        folder_files = files.setdefault(rel, [])
+        with it:
+            for entry in it:
+                child = f"{rel}/{entry.name}" if rel else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(child)
+                elif entry.is_file():
+                    folder_files.append(child)
+        folder_files.sort()
+    return files
+
+
+def collect_files(main_folder_path):
+    """Files per output folder. The folder walk decides, so screenshots filed by hand count too;
+    the manifest only prevents double counting: when a sorted screenshot was also copied into
+    another folder by hand, only the hand-filed copy counts.
+    """
+    files = scan_files(main_folder_path)
+    hashes = load_manifest_hashes(main_folder_path)
+    if not hashes:
+        return files
+    sizes = {}
+    for dest, (size, image_hash) in hashes.items():
+        sizes.setdefault(size, {}).setdefault(image_hash, []).append(dest)
+    superseded = set()
+    for folder_files in files.values():
+        for rel in folder_files:
+            if rel in hashes:
+                continue
+            path = os.path.join(main_folder_path, rel)
+            try:
+                candidates = sizes.get(os.path.getsize(path))
+                if candidates:  # hash only hand-filed files of a sorted screenshot's size
+                    superseded.update(candidates.get(file_sha256(path), []))
+            except OSError:
+                continue
+    if superseded:
+        for folder, folder_files in files.items():
+            files[folder] = [rel for rel in folder_files if rel not in superseded]
+    return files
+
+
+# === SCORING ===
+@dataclass
+class ScoreLine:
+    category: str
+    folder: str
+    label: str
+    files: List[str]
+    per_file_score: int
+
+    @property
+    def file_count(self) -> int:
+        return len(self.files)
+
+    @property
+    def score(self) -> int:
+        return self.file_count * self.per_file_score
+
+
+@dataclass
+class ScoreReport:
+    lines: List[ScoreLine] = field(default_factory=list)
+    target_total_score: Optional[int] = None
+
+    @property
+    def total_score(self) -> int:
+        return sum(line.score for line in self.lines)
+
+    @property
+    def reanimation_score(self) -> int:
+        return sum(line.score for line in self.lines if line.category == 'reanimation')
+
+    @property
+    def reanimation_percent(self) -> float:
+        return (self.reanimation_score / self.total_score) * 100 if self.total_score else 0.0
+
+    @property
+    def required_reanimation_points(self) -> int:
+        """Reanimation points to add to reach target_percentage (0 when already reached)."""
+        if self.reanimation_percent >= target_percentage:
+            return 0
+        required_points = (target_percentage / 100 * self.total_score - self.reanimation_score) / (1 - target_percentage / 100)
+        return max(0, int(required_points) + 1)  # round up
+
+    @property
+    def min_needed_removal(self) -> int:
+        """Non-reanimation points to delete so reanimation reaches target_percentage."""
+        return math.ceil(self.total_score - (self.reanimation_score / (target_percentage / 100)))
+
+
+def score(main_folder_path=main_folder_path, target_total_score=None, files=None) -> ScoreReport:
+    """Collect the sorted screenshots (manifest or a single folder walk) and apply the scoring rules."""
+    files = files if files is not None else collect_files(main_folder_path)
+    report = ScoreReport(target_total_score=target_total_score)
+    for category, folder, label, per_file_score in scoring_rules():
+        if folder in files or os.path.isdir(os.path.join(main_folder_path, folder)):
+            report.lines.append(ScoreLine(category, folder, label, files.get(folder, []), per_file_score))
+    return report
 
-# Ask the user to enter the target total score
-if args.target_score is not None:
-    target_total_score = args.target_score
-else:
+
+# === DELETION PLANNER ===
+@dataclass
+class DeletionPlan:
+    files: List[str] = field(default_factory=list)   # relative to the output folder
+    removed_points: int = 0
+    feasible: bool = True
+    message: str = ''
+
+
+def required_removal_range(report: ScoreReport):
+    """Points of non-reanimation screenshots to remove: (at least, at most) to keep the
+    reanimation share >= target_percentage and the total >= target_total_score."""
+    total_score = report.total_score
+    reanimation_score = report.reanimation_score
+    # reanimation_score * 100 >= target_percentage * (total_score - x)
+    at_least = max(0, total_score - (reanimation_score * 100) // target_percentage)
+    at_most = total_score - reanimation_score
+    if report.target_total_score is not None:
+        at_most = min(at_most, total_score - report.target_total_score)
+    return at_least, at_most
+
+
+def plan_deletions(report: ScoreReport, minimize: str = 'points') -> DeletionPlan:
+    """Choose which heal/vaccine screenshots to drop to reach the reanimation threshold.
+
+    Bounded knapsack over the point values (1/2/3/5 with their file counts): for every
+    reachable sum of removed points it keeps the fewest files, so both 'points' (fewest
+    lost points, then fewest files) and 'files' (fewest files, then fewest points) are exact.
+    """
+    from array import array
+    from collections import deque
+    at_least, at_most = required_removal_range(report)
+    if at_least == 0:
+        return DeletionPlan(message=f"Current reanimation score already meets {target_percentage}% threshold.")
+    if report.reanimation_score == 0:
+        # deleting everything else would "reach" the share with a total of 0
+        return DeletionPlan(feasible=False, message=f"Cannot reach {target_percentage}% reanimation threshold "
+                                                    f"without reanimation points.")
+    groups = {}
+    for line in report.lines:
+        if line.category != 'reanimation' and line.per_file_score > 0:
+            groups.setdefault(line.per_file_score, []).extend(line.files)
+    if at_most < at_least:
+        reason = "by deleting screenshots alone"
+        if report.target_total_score is not None and at_least <= report.total_score - report.reanimation_score:
+            reason = f"without dropping below the target total score of {report.target_total_score}"
+        return DeletionPlan(feasible=False, message=f"Cannot reach {target_percentage}% reanimation threshold {reason}.")
+    if not groups:
+        return DeletionPlan(feasible=False, message=f"Cannot reach {target_percentage}% reanimation threshold by deleting screenshots alone.")
+    values = sorted(groups)
+    # no optimal plan overshoots at_least by a whole screenshot, so sums above this are never needed
+    limit = min(at_most, at_least + max(values) - 1)
+    inf = sum(len(f) for f in groups.values()) + 1
+    best = array('l', [0] + [inf] * limit)   # fewest files per removed-points sum
+    choices = []
+    for value in values:
+        count = len(groups[value])
+        new = array('l', [inf] * (limit + 1))
+        taken = array('l', [0] * (limit + 1))
+        for residue in range(min(value, limit + 1)):
+            window = deque()   # (index j, best[j] - j) with increasing values
+            for j, total in enumerate(range(residue, limit + 1, value)):
+                if best[total] < inf:
+                    key = best[total] - j
+                    while window and window[-1][1] >= key:
+                        window.pop()
+                    window.append((j, key))
+                while window and window[0][0] < j - count:
+                    window.popleft()
+                if window:
+                    i, key = window[0]
+                    new[total] = key + j
+                    taken[total] = j - i
+        best = new
+        choices.append(taken)
+    reachable = [total for total in range(at_least, limit + 1) if best[total] < inf]
+    if not reachable:
+        return DeletionPlan(feasible=False,
+                            message=f"Cannot reach {target_percentage}% reanimation threshold with the available screenshots.")
+    if minimize == 'files':
+        chosen = min(reachable, key=lambda total: (best[total], total))
+    else:
+        chosen = min(reachable, key=lambda total: (total, best[total]))
+    plan = DeletionPlan(removed_points=chosen)
+    remaining = chosen
+    for value, taken in zip(reversed(values), reversed(choices)):
+        k = taken[remaining]
+        plan.files.extend(groups[value][:k])
+        remaining -= k * value
+    plan.files.sort()
+    plan.message = (f"Delete {len(plan.files)} screenshots ({chosen} non-reanimation points) "
+                    f"to meet the {target_percentage}% reanimation threshold.")
+    return plan
+
+
+def write_text_atomic(path, text):
+    """Temp file + rename, so an interrupted run never leaves half a report."""
+    tmp_path = f"{path}.{os.getpid()}-{os.urandom(4).hex()}.tmp"
+    with open(tmp_path, 'x', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def save_deletion_list(plan: DeletionPlan, path='deletion-list.txt'):
+    """Write the plan's files; without any, remove the list an earlier run left so nobody acts on it."""
+    if not plan.files:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    write_text_atomic(path, ''.join(line + '\n' for line in plan.files))
+
+def format_report(report: ScoreReport, plan: Optional[DeletionPlan] = None) -> str:
+    out = []
+    out.append("\nDETAILED REPORT:")
+    out.append("----------------------------")
+    for line in report.lines:
+        out.append(f"{line.label}: {line.file_count} | {line.per_file_score} | {line.score}")
+    out.append("----------------------------")
+    total_score = report.total_score
+    reanimation_score = report.reanimation_score
+    out.append(f"TOTAL SCORE: {total_score}")
+    if total_score > 0:
+        percent = report.reanimation_percent
+        out.append(f"Reanimation % of total: {reanimation_score} pts → {percent:.2f}%")
+        # Check if reanimation meets 70% goal
+        if percent < target_percentage:
+            out.append(f"⚠ To reach {target_percentage}% reanimation score, you need at least {report.required_reanimation_points} more reanimation points.")
+        else:
+            out.append(f"✅ Reanimation goal of {target_percentage}% achieved!")
+
+        # Part 1 – Target total score
+        target_total_score = report.target_total_score
+        if target_total_score is not None:
+            if total_score < target_total_score:
+                more_needed = target_total_score - total_score
+                out.append(f"📈 You need {more_needed} more points to reach the target total score of {target_total_score}.")
+            else:
+                out.append(f"✅ Total score target of {target_total_score} reached.")
+
+        # Part 2 – How many non-reanimation points to delete to reach 70%
+        # such that: reanimation_score / (total_score - x) >= 0.7
+        required_ratio = target_percentage / 100
+        max_removable = total_score - reanimation_score
+        min_needed_removal = report.min_needed_removal
+        if reanimation_score / total_score >= required_ratio:
+            out.append(f"✅ Current reanimation score already meets {target_percentage}% threshold.")
+        elif reanimation_score > 0 and min_needed_removal <= max_removable:
+            out.append(f"🗑️ You can delete at least {min_needed_removal} non-reanimation points ({min_needed_removal} worth of screenshots)")
+            out.append(f"   to meet the {target_percentage}% reanimation threshold.")
+        else:
+            out.append(f"❌ You cannot reach {target_percentage}% reanimation threshold by deleting screenshots alone.")
+
+        # Part 3 – Which screenshots to delete
+        if plan is not None and plan.files:
+            out.append(f"🗑️ {plan.message}")
+            per_folder = {}
+            for path in plan.files:
+                folder = path.rsplit('/', 1)[0]
+                per_folder[folder] = per_folder.get(folder, 0) + 1
+            for folder, count in per_folder.items():
+                out.append(f"   {folder}: {count}")
+        elif plan is not None and not plan.feasible:
+            out.append(f"❌ {plan.message}")
+    else:
+        out.append("No files found. Total score is 0.")
+    return '\n'.join(out) + '\n'
+
+
+def write_report(report: ScoreReport, path='report.txt', plan: Optional[DeletionPlan] = None) -> str:
+    text = format_report(report, plan)
+    write_text_atomic(path, text)
+    return text
+
+
+def ask_target_score() -> int:
     while True:
         try:
             target_total_score = int(input("🎯 Enter your target total score: "))
             if target_total_score > 0:
-                break
-            else:
-                print("Please enter a positive number.", file=o)
+                return target_total_score
+            print("Please enter a positive number.")
         except ValueError:
-            print("Invalid input. Please enter a number.", file=o)
-
-
-# Count and score 'heal' and 'vaccine'
-for category in ['heal', 'vaccine']:
-    for loc in locations:
-        folder_path = os.path.join(main_folder_path, category, loc)
-        if os.path.exists(folder_path):
-            file_count = len([
-                f for f in os.listdir(folder_path)
-                if os.path.isfile(os.path.join(folder_path, f))
-            ])
-            per_file_score = (heal_scores if category == 'heal' else vaccine_scores)[loc]
-            score = file_count * per_file_score
-            total_score += score
-            detailed_report.append(
-                f"{category.capitalize()} – {loc}: {file_count} | {per_file_score} | {score}"
-            )
-
-# Count and score 'reanimation'
-for loc in reanimation_locations:
-    for time in timestamp:
-        folder_path = os.path.join(main_folder_path, 'reanimation', loc, time)
-        if os.path.exists(folder_path):
-            file_count = len([
-                f for f in os.listdir(folder_path)
-                if os.path.isfile(os.path.join(folder_path, f))
-            ])
-            per_file_score = reanimation_scores.get((loc, time), 0)
-            score = file_count * per_file_score
-            reanimation_score += score
-            total_score += score
-            detailed_report.append(
-                f"Reanimation – {loc}/{time}: {file_count} | {per_file_score} | {score}"
-            )
-
-# Print the report
-print("\nDETAILED REPORT:", file=o)
-print("----------------------------", file=o)
-for line in detailed_report:
-    print(line, file=o)
-print("----------------------------", file=o)
-print(f"TOTAL SCORE: {total_score}", file=o)
-if total_score > 0:
-    percent = (reanimation_score / total_score) * 100
-    print(f"Reanimation % of total: {reanimation_score} pts → {percent:.2f}%", file=o)
-    # Check if reanimation meets 70% goal
-    target_percentage = 70
-    if percent < target_percentage:
-        # How many reanimation points needed to reach 70%
-        required_points = (target_percentage / 100 * total_score - reanimation_score) / (1 - target_percentage / 100)
-        required_points = max(0, int(required_points) + 1)  # round up
-        print(f"⚠ To reach {target_percentage}% reanimation score, you need at least {required_points} more reanimation points.", file=o)
-    else:
-        print(f"✅ Reanimation goal of {target_percentage}% achieved!", file=o)
+            print("Invalid input. Please enter a number.")
 
-    # Part 1 – Target total score
-    if total_score < target_total_score:
-        more_needed = target_total_score - total_score
-        print(f"📈 You need {more_needed} more points to reach the target total score of {target_total_score}.", file=o)
-    else:
-        print(f"✅ Total score target of {target_total_score} reached.", file=o)
-
-    # Part 2 – How many non-reanimation points to delete to reach 70%
-    non_reanimation_score = total_score - reanimation_score
-    required_ratio = 0.7
-
-    # Solve for how many non-reanimation points to remove
-    # such that: reanimation_score / (total_score - x) >= 0.7
-    import math
-    max_removable = non_reanimation_score
-    min_needed_removal = math.ceil(total_score - (reanimation_score / required_ratio))
-
-    if reanimation_score / total_score >= required_ratio:
-        print(f"✅ Current reanimation score already meets {int(required_ratio * 100)}% threshold.", file=o)
-    elif min_needed_removal <= max_removable:
-        print(f"🗑️ You can delete at least {min_needed_removal} non-reanimation points ({min_needed_removal} worth of screenshots)", file=o)
-        print(f"   to meet the {int(required_ratio * 100)}% reanimation threshold.", file=o)
-    else:
-        print(f"❌ You cannot reach {int(required_ratio * 100)}% reanimation threshold by deleting screenshots alone.", file=o)
 
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--target-score', type=int, help='Target total score')
+    parser.add_argument('--output-images', default=main_folder_path, help='Sorted images directory')
+    parser.add_argument('--report', default='report.txt', help='Report file')
+    parser.add_argument('--minimize', choices=['points', 'files'], default='points',
+                        help='Deletion plan: fewest lost points or fewest deleted screenshots')
+    parser.add_argument('--deletion-list', default='deletion-list.txt',
+                        help='Where to write the screenshots to delete/exclude, relative to the output folder')
+    args = parser.parse_args()
+
+    # Ask the user to enter the target total score
+    target_total_score = args.target_score if args.target_score is not None else ask_target_score()
+    report = score(args.output_images, target_total_score)
+    plan = plan_deletions(report, args.minimize)
+    save_deletion_list(plan, args.deletion_list)
+    write_report(report, args.report, plan)
 
 
-else:
-    print("No files found. Total score is 0.", file=o)
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,365 @@
+import io
 import logging
-import easyocr
 import os
-from glob import glob
 import re
 import shutil
 import json
 from rapidfuzz import fuzz, process
 import argparse
-from typing import Optional, Tuple
+from typing import Iterator, NamedTuple, Optional, Tuple
 import sys
+import hashlib
+import sqlite3
+import tarfile
+import threading
+import time
+import zipfile
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+import numpy as np
 
-# Configure logging
-logging.basicConfig(
-    filename='app.log',         # Log file name
-    filemode='a',               # Append mode ('w' to overwrite)
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    level=logging.INFO          # Minimum level to log
-)
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from multiprocessing import parent_process
+
+# Configure logging: app.log rotates at 5 MB, keeping app.log.1 .. app.log.5.
+# Only the main process writes the file; pool workers send their records through worker_log_queue()
+if parent_process() is None:
+    logging.basicConfig(
+        handlers=[RotatingFileHandler('app.log', maxBytes=5 * 1024 * 1024, backupCount=5,
+                                      encoding='utf-8', delay=True)],
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        level=logging.INFO          # Minimum level to log
+    )
+
+_log_queue = None
+
+class _MainProcessLog(logging.Handler):
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+def worker_log_queue():
+    """Queue for the pool workers' log records, written out by a listener thread of this process."""
+    global _log_queue
+    if _log_queue is None:
+        import atexit
+        import multiprocessing
+        _log_queue = multiprocessing.Queue()
+        listener = QueueListener(_log_queue, _MainProcessLog())
+        listener.start()
+        atexit.register(listener.stop)
+    return _log_queue
+
+def log_to_queue(log_queue):
+    """Worker initializer: log through log_queue only, dropping the app.log handler a fork inherits."""
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(logging.INFO)
 
 # === HELPERS ===
-def find_image(base_name: str, image_folder: str) -> Optional[str]:
-    for ext in ['.png', '.jpg', '.jpeg', '.bmp']:
-        candidate = os.path.join(image_folder, base_name + ext)
-        if os.path.exists(candidate):
-            return candidate
-    return None
+IMAGE_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.bmp']
+
+# Screenshots inside an archive are addressed as "<archive>::<member>" and read into memory,
+# never extracted. Compressed tarballs can't seek to a member, so only .zip and plain .tar.
+ARCHIVE_EXTENSIONS = ['.zip', '.tar']
+ARCHIVE_SEPARATOR = '::'
+# stem of a screenshot in a subfolder or archive: "<folder>__<archive stem>__<name>"
+NESTED_STEM_SEPARATOR = '__'
+
+def is_archive(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in ARCHIVE_EXTENSIONS
+
+def archive_member(path: str) -> Tuple[str, Optional[str]]:
+    """(archive, member) for an archive member path, (path, None) for a plain file."""
+    archive, sep, member = path.partition(ARCHIVE_SEPARATOR)
+    if sep and is_archive(archive):
+        return archive, member
+    return path, None
+
+_archives = {}  # archive path -> (pid, size, mtime_ns, handle, tar members or None, lock)
+_archives_lock = threading.Lock()
+
+def _open_archive(path: str) -> tuple:
+    """Open archive handle of this process; reopened when the file changes. Forked OCR workers
+    get their own, a shared file offset would mix up their reads."""
+    st = os.stat(path)
+    with _archives_lock:
+        cached = _archives.get(path)
+        if cached and cached[:3] == (os.getpid(), st.st_size, st.st_mtime_ns):
+            return cached
+        if path.lower().endswith('.zip'):
+            handle, members = zipfile.ZipFile(path), None
+        else:
+            handle = tarfile.open(path, 'r:')
+            members = {m.name: m for m in handle.getmembers() if m.isfile()}
+        cached = _archives[path] = (os.getpid(), st.st_size, st.st_mtime_ns, handle, members, threading.Lock())
+        return cached
+
+def open_input(path: str):
+    """Binary file object of a screenshot: the file itself, or an archive member read into memory."""
+    archive, member = archive_member(path)
+    if member is None:
+        return open(path, 'rb')
+    _, _, _, handle, members, lock = _open_archive(archive)
+    with lock:
+        data = handle.read(member) if members is None else handle.extractfile(members[member]).read()
+    return io.BytesIO(data)
+
+class ImageEntry(NamedTuple):
+    stem: str
+    path: str
+    size: int
+    mtime_ns: int
+
+class ImageIndex:
+    """Screenshots of a folder from a single os.scandir pass: stem -> entry.
+
+    Extensions are matched case-insensitively; when one stem has several images the
+    IMAGE_EXTENSIONS order decides, like the old per-extension probing did.
+    Subfolders and .zip/.tar archives (in the folder, or as the folder itself) are scanned too;
+    their screenshots get stems prefixed with the folder/archive names, joined by NESTED_STEM_SEPARATOR.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.entries = {}
+        if is_archive(folder) and os.path.isfile(folder):
+            self._scan_archive(folder, '')
+            return
+        stack = [(folder, '')]
+        while stack:
+            path, prefix = stack.pop()
+            try:
+                scan = os.scandir(path)
+            except OSError as e:
+                logging.error(f"Failed to scan {path}: {e}")
+                continue
+            with scan:
+                for entry in scan:
+                    stem, ext = os.path.splitext(entry.name)
+                    ext = ext.lower()
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, prefix + entry.name + NESTED_STEM_SEPARATOR))
+                    elif ext in ARCHIVE_EXTENSIONS and entry.is_file():
+                        self._scan_archive(entry.path, prefix + stem + NESTED_STEM_SEPARATOR)
+                    elif ext in IMAGE_EXTENSIONS and entry.is_file():
+                        st = entry.stat()
+                        self._add(ImageEntry(prefix + stem, entry.path, st.st_size, st.st_mtime_ns))
+
+    def _add(self, image: ImageEntry):
+        known = self.entries.get(image.stem)
+        if known and IMAGE_EXTENSIONS.index(os.path.splitext(known.path)[1].lower()) <= \
+                IMAGE_EXTENSIONS.index(os.path.splitext(image.path)[1].lower()):
+            return
+        self.entries[image.stem] = image
+
+    def _scan_archive(self, path: str, prefix: str):
+        try:
+            st = os.stat(path)
+            _, _, _, handle, members, _ = _open_archive(path)
+        except (OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+            logging.error(f"Failed to open archive {path}: {e}")
+            return
+        if members is None:
+            names = [(info.filename, info.file_size) for info in handle.infolist() if not info.is_dir()]
+        else:
+            names = [(name, member.size) for name, member in members.items()]
+        for name, size in names:
+            folder, base = name.rpartition('/')[::2]
+            stem, ext = os.path.splitext(base)
+            if ext.lower() not in IMAGE_EXTENSIONS or base.startswith('._') or name.startswith('__MACOSX/'):
+                continue  # macOS resource forks look like images
+            if folder:
+                stem = folder.replace('/', NESTED_STEM_SEPARATOR) + NESTED_STEM_SEPARATOR + stem
+            # members share the archive's mtime: any change to the archive re-checks their hashes
+            self._add(ImageEntry(prefix + stem, f"{path}{ARCHIVE_SEPARATOR}{name}", size, st.st_mtime_ns))
+
+    @classmethod
+    def from_entries(cls, folder: str, entries) -> 'ImageIndex':
+        index = cls.__new__(cls)
+        index.folder = folder
+        index.entries = {entry.stem: entry for entry in entries}
+        return index
+
+    def find(self, stem: str) -> Optional[str]:
+        entry = self.entries.get(stem)
+        return entry.path if entry else None
+
+    def __iter__(self) -> Iterator[ImageEntry]:
+        return iter(sorted(self.entries.values()))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+class Cancelled(Exception):
+    """The run was stopped through its cancel event."""
+
+def check_cancel(cancel):
+    """cancel: threading.Event or None. Called between files by every long loop."""
+    if cancel is not None and cancel.is_set():
+        raise Cancelled()
 
 def safe_filename(s: str) -> str:
     return s.replace(":", "-").replace(".", "-")
 
+@contextmanager
+def atomic_open(path: str, mode: str = 'w', sync: bool = True):
+    """Write path through a temp file next to it, renamed over it on success: a crash leaves the
+    old file or the new one, never half of one. sync also fsyncs it first, so the new content
+    survives a power loss too. Every call gets its own temp file (created exclusively), so
+    threads writing the same path race only on the final rename."""
+    tmp_path = f"{path}.{os.getpid()}-{os.urandom(4).hex()}.tmp"
+    f = open(tmp_path, mode.replace('w', 'x'), **({} if 'b' in mode else {'encoding': 'utf-8'}))
+    try:
+        with f:
+            yield f
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+# === МЕТРИКИ ===
+METRIC_STAGES = ('decode', 'ocr', 'classify', 'find_image', 'copy')
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class RunMetrics:
+    """Counters, per-stage latency histograms and the slowest files of each stage for one run.
+
+    Thread-safe; stages timed in worker processes are sent back and recorded with observe().
+    """
+
+    def __init__(self, slowest: int = 10):
+        self.slowest_n = slowest
+        self.started = time.time()
+        self.counters = {}
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def count(self, name: str, n: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, stage: str, seconds: float, item: Optional[str] = None):
+        import heapq
+        with self.lock:
+            st = self.stages.get(stage)
+            if st is None:
+                st = self.stages[stage] = {'count': 0, 'sum': 0.0, 'max': 0.0,
+                                           'buckets': [0] * len(LATENCY_BUCKETS), 'slowest': []}
+            st['count'] += 1
+            st['sum'] += seconds
+            st['max'] = max(st['max'], seconds)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    st['buckets'][i] += 1
+                    break
+            if item is not None:
+                if len(st['slowest']) < self.slowest_n:
+                    heapq.heappush(st['slowest'], (seconds, item))
+                elif seconds > st['slowest'][0][0]:
+                    heapq.heapreplace(st['slowest'], (seconds, item))
+
+    def timed(self, stage: str, item: Optional[str] = None):
+        """Context manager: with metrics.timed('copy', path): ..."""
+
+        @contextmanager
+        def timer():
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.observe(stage, time.perf_counter() - start, item)
+        return timer()
+
+    def summary(self) -> dict:
+        with self.lock:
+            duration = time.time() - self.started
+            stages = {}
+            order = [s for s in METRIC_STAGES if s in self.stages]
+            order += sorted(s for s in self.stages if s not in METRIC_STAGES)
+            for stage in order:
+                st = self.stages[stage]
+                cumulative, buckets = 0, {}
+                for bound, n in zip(LATENCY_BUCKETS, st['buckets']):
+                    cumulative += n
+                    buckets[str(bound)] = cumulative
+                buckets['+Inf'] = st['count']
+                stages[stage] = {
+                    'count': st['count'],
+                    'total_s': round(st['sum'], 4),
+                    'mean_ms': round(st['sum'] / st['count'] * 1000, 2) if st['count'] else 0,
+                    'max_ms': round(st['max'] * 1000, 2),
+                    'buckets': buckets,
+                    'slowest': [{'item': item, 'ms': round(sec * 1000, 2)}
+                                for sec, item in sorted(st['slowest'], reverse=True)],
+                }
+            return {
+                'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                'duration_s': round(duration, 3),
+                'counters': dict(sorted(self.counters.items())),
+                'stages': stages,
+            }
+
+    def write_json(self, path: str):
+        with atomic_open(path) as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+
+    def write_prometheus(self, path: str, prefix: str = 'gtaocr'):
+        """node_exporter textfile collector format, replaced atomically."""
+        summary = self.summary()
+        out = [f"# HELP {prefix}_stage_seconds Per-stage latency of the last run",
+               f"# TYPE {prefix}_stage_seconds histogram"]
+        for stage, st in summary['stages'].items():
+            for bound, n in st['buckets'].items():
+                out.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {n}')
+            out.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {st["total_s"]}')
+            out.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {st["count"]}')
+        out += [f"# HELP {prefix}_events_total Events of the last run", f"# TYPE {prefix}_events_total counter"]
+        for name, n in summary['counters'].items():
+            out.append(f'{prefix}_events_total{{event="{name}"}} {n}')
+        out += [f"# TYPE {prefix}_run_duration_seconds gauge", f"{prefix}_run_duration_seconds {summary['duration_s']}",
+                f"# TYPE {prefix}_last_run_timestamp_seconds gauge", f"{prefix}_last_run_timestamp_seconds {time.time():.0f}"]
+        with atomic_open(path) as f:
+            f.write('\n'.join(out) + '\n')
+
+    def write_reports(self, summary_path: Optional[str] = None, prometheus_path: Optional[str] = None):
+        try:
+            if summary_path:
+                self.write_json(summary_path)
+            if prometheus_path:
+                self.write_prometheus(prometheus_path)
+        except OSError as e:
+            logging.error(f"Failed to write run metrics: {e}")
+
 # === ЛОКАЦИИ ИЗ PY ===
-def load_location_map(py_path):
+def load_py_module(py_path):
+    """Import a .py file by path (the repo's scripts have dashes in their names)."""
     import importlib.util
-    import sys
-    import os
+    module_name = os.path.splitext(os.path.basename(py_path))[0]
+    spec = importlib.util.spec_from_file_location(module_name, py_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def resource_path(name: str) -> str:
+    """A file shipped next to this script, or inside the PyInstaller bundle."""
+    if os.path.exists(name):
+        return name
+    base = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base, name)
+
+def load_location_map(py_path):
     try:
-        module_name = os.path.splitext(os.path.basename(py_path))[0]
-        spec = importlib.util.spec_from_file_location(module_name, py_path)
-        module = importlib.util.module_from_spec(spec)
-        sys.modules[module_name] = module
-        spec.loader.exec_module(module)
+        module = load_py_module(py_path)
         locations = getattr(module, 'locations', [])
         return {loc['name']: 'City' if loc.get('City') == 1 else 'NotCity' for loc in locations}
     except Exception as e:
@@ -47,40 +367,140 @@ def load_location_map(py_path):
         return {}
 
 # === ПАРСИНГ ДЕЙСТВИЯ ===
+# (action, phrase to fuzzy-match, pattern that extracts the person name), in priority order
+ACTION_PATTERNS = [
+    ("heal", "вы вылечили", re.compile(r"выл[её]чили\D+?([A-Za-zА-Яа-яЁё0-9_ ]{3,40})", re.IGNORECASE)),
+    ("vaccine", "вы вакцинировали", re.compile(r"вакцинировали\D+?([A-Za-zА-Яа-яЁё0-9_ ]{3,40})", re.IGNORECASE)),
+    ("reanimation", "вы реанимировали", re.compile(r"реанимировали\D+?([A-Za-zА-Яа-яЁё0-9_ ]{3,40})", re.IGNORECASE)),
+]
+ACTION_PHRASES = [phrase for _, phrase, _ in ACTION_PATTERNS]
+ACTION_THRESHOLD = 80
+
+def match_action(lines, scores) -> Tuple[Optional[str], Optional[str], Optional[int]]:
+    """Pick the action from per-line phrase scores (len(ACTION_PATTERNS) x len(lines)).
+
+    Like the original probes, only the first phrase above the threshold is tried on a line.
+    Returns (action, name, line index).
+    """
+    for j, line in enumerate(lines):
+        for k, (action, _, pattern) in enumerate(ACTION_PATTERNS):
+            if scores[k][j] > ACTION_THRESHOLD:
+                match = pattern.search(line)
+                if match:
+                    name = match.group(1).strip()
+                    if 1 <= len(name.split()) <= 2:
+                        return action, name, j
+                break
+    return None, None, None
+
+def action_scores(lines):
+    return process.cdist(ACTION_PHRASES, [line.lower() for line in lines],
+                         scorer=fuzz.partial_ratio, processor=None, score_cutoff=ACTION_THRESHOLD)
+
 def detect_action(text):
-    for line in text.splitlines():
-        l = line.lower()
-        if fuzz.partial_ratio("вы вылечили", l) > 80:
-            match = re.search(r"выл[её]чили\D+([A-Za-zА-Яа-яЁё0-9_ ]{3,40})", line, re.IGNORECASE)
-            if match:
-                name = match.group(1).strip()
-                if 1 <= len(name.split()) <= 2:
-                    return "heal", name
-        elif fuzz.partial_ratio("вы вакцинировали", l) > 80:
-            match = re.search(r"вакцинировали\D+([A-Za-zА-Яа-яЁё0-9_ ]{3,40})", line, re.IGNORECASE)
-            if match:
-                name = match.group(1).strip()
-                if 1 <= len(name.split()) <= 2:
-                    return "vaccine", name
-        elif fuzz.partial_ratio("вы реанимировали", l) > 80:
-            match = re.search(r"реанимировали\D+([A-Za-zА-Яа-яЁё0-9_ ]{3,40})", line, re.IGNORECASE)
-            if match:
-                name = match.group(1).strip()
-                if 1 <= len(name.split()) <= 2:
-                    return "reanimation", name
-    return None, None
+    lines = text.splitlines()
+    if not lines:
+        return None, None
+    action, name, _ = match_action(lines, action_scores(lines))
+    return action, name
 
 # === ДАТА + ОПРЕДЕЛЕНИЕ ДНЯ/НОЧИ ===
-def extract_datetime(text):
-    pattern = r'(\d{1,2})[.:](\d{2})\s+(\d{2})[.\-/]?(\d{2})[.\-/]?(\d{4})'
-    match = re.search(pattern, text)
+DATETIME_PATTERN = re.compile(r'(\d{1,2})[.:](\d{2})\s+(\d{2})[.\-/]?(\d{2})[.\-/]?(\d{4})')
+
+def find_datetime(text):
+    """Return (datetime, time_of_day, first line, last line); time and date may sit on adjacent lines."""
+    match = DATETIME_PATTERN.search(text)
     if match:
         h, m, d, mo, y = match.groups()
         hour = int(h)
         time_of_day = "Day" if 12 <= hour < 22 else "Night"
         full = f"{h.zfill(2)}:{m} {d.zfill(2)}.{mo.zfill(2)}.{y}"
-        return full, time_of_day
-    return None, None
+        first = text.count('\n', 0, match.start())
+        return full, time_of_day, first, first + match.group(0).count('\n')
+    return None, None, None, None
+
+def extract_datetime(text):
+    full, time_of_day, _, _ = find_datetime(text)
+    return full, time_of_day
+
+# === FUZZY МАТЧИНГ ЛОКАЦИЙ ===
+# Latin letters that OCR confuses with Cyrillic ones, plus ё and dashes
+_LOCATION_TRANSLATION = str.maketrans({
+    'a': 'а', 'b': 'в', 'c': 'с', 'e': 'е', 'h': 'н', 'k': 'к', 'm': 'м',
+    'o': 'о', 'p': 'р', 't': 'т', 'x': 'х', 'y': 'у', 'ё': 'е',
+    '-': ' ', '‐': ' ', '–': ' ', '—': ' ', '«': '', '»': '', '"': '',
+})
+
+LOCATION_THRESHOLD = 85
+
+def normalize_location_text(s: str) -> str:
+    return ' '.join(s.lower().translate(_LOCATION_TRANSLATION).split())
+
+class LocationMatcher:
+    """Best-match fuzzy lookup of location names in OCR text.
+
+    Names are normalized once, candidates for a line are prefiltered with a
+    character n-gram index and only the survivors are scored with partial_ratio.
+    """
+
+    def __init__(self, location_map: dict, threshold: float = LOCATION_THRESHOLD, ngram: int = 3, min_shared: float = 0.3):
+        self.names = list(location_map)
+        self.values = [location_map[name] for name in self.names]
+        self.normalized = [normalize_location_text(name) for name in self.names]
+        self.threshold = threshold
+        self.ngram = ngram
+        self.min_shared = min_shared
+        self.index = {}
+        self.required = []
+        for i, name in enumerate(self.normalized):
+            grams = self._ngrams(name)
+            for gram in grams:
+                self.index.setdefault(gram, []).append(i)
+            self.required.append(max(1, int(len(grams) * min_shared)))
+
+    def _ngrams(self, s: str) -> set:
+        return {s[i:i + self.ngram] for i in range(len(s) - self.ngram + 1)}
+
+    def candidates(self, line: str) -> list:
+        hits = {}
+        for gram in self._ngrams(line):
+            for i in self.index.get(gram, ()):
+                hits[i] = hits.get(i, 0) + 1
+        return [i for i, count in hits.items() if count >= self.required[i]]
+
+    def match_line(self, line: str) -> Tuple[Optional[int], float]:
+        # names closest in length to the line first, so on equal scores "Мост каньона Ратон"
+        # beats "Каньон Ратон" and a bare "Чумаш" line stays "Чумаш"
+        candidates = sorted(self.candidates(line), key=lambda i: (abs(len(self.normalized[i]) - len(line)), i))
+        if not candidates:
+            return None, 0
+        best = process.extractOne(
+            line, [self.normalized[i] for i in candidates],
+            scorer=fuzz.partial_ratio, processor=None, score_cutoff=self.threshold,
+        )
+        if best is None or best[1] <= self.threshold:
+            return None, 0
+        return candidates[best[2]], best[1]
+
+    def locate(self, text: str) -> Tuple[Optional[str], Optional[str], float, Optional[int]]:
+        """Return (name, value, score, line index) of the best scoring location over all lines."""
+        best_i, best_key, best_line = None, None, None
+        for j, line in enumerate(text.splitlines()):
+            line = normalize_location_text(line)
+            i, score = self.match_line(line)
+            if i is None:
+                continue
+            key = (score, -abs(len(self.normalized[i]) - len(line)))
+            if best_key is None or key > best_key:
+                best_i, best_key, best_line = i, key, j
+        if best_i is None:
+            return None, None, 0, None
+        return self.names[best_i], self.values[best_i], best_key[0], best_line
+
+    def match(self, text: str) -> Tuple[Optional[str], Optional[str], float]:
+        """Return (name, value, score) of the best scoring location over all lines."""
+        name, value, score, _ = self.locate(text)
+        return name, value, score
 
 # === ОБЫЧНЫЕ ЛОКАЦИИ ===
 LOCATION_MAP = {
@@ -88,129 +508,2541 @@ LOCATION_MAP = {
     "Сэнди-Шорс": "Sandy-Shores",
     "Палето-Бэй": "Paleto-Bay",
 }
+SIMPLE_LOCATION_MATCHER = LocationMatcher(LOCATION_MAP)
 
 def detect_simple_location(text):
-    for line in text.splitlines():
-        for loc_name, folder_name in LOCATION_MAP.items():
-            if fuzz.partial_ratio(loc_name.lower(), line.lower()) > 85:
-                return folder_name
-    return None
+    _, folder_name, _ = SIMPLE_LOCATION_MATCHER.match(text)
+    return folder_name
 
 # === ЛОКАЦИЯ ДЛЯ REANIMATION ===
 def detect_reanimation_location(text, reanimation_location_map):
-    for line in text.splitlines():
-        for loc_name in reanimation_location_map:
-            if fuzz.partial_ratio(loc_name.lower(), line.lower()) > 85:
-                return loc_name, reanimation_location_map[loc_name]
+    """reanimation_location_map is a LocationMatcher (build it once per run) or a plain name -> flag dict."""
+    matcher = reanimation_location_map
+    if not isinstance(matcher, LocationMatcher):
+        matcher = LocationMatcher(reanimation_location_map)
+    loc_name, city_flag, _ = matcher.match(text)
+    return loc_name, city_flag
+
+# === КЛАССИФИКАТОР ===
+@dataclass
+class Classification:
+    action: Optional[str] = None
+    name: Optional[str] = None
+    datetime: Optional[str] = None
+    time_of_day: Optional[str] = None
+    location: Optional[str] = None          # matched location name
+    location_folder: Optional[str] = None   # ELSH/Sandy-Shores/Paleto-Bay, or City/NotCity for reanimation
+    location_score: float = 0
+    action_line: Optional[int] = None       # indexes into the OCR lines the fields were read from
+    datetime_lines: Optional[Tuple[int, int]] = None
+    location_line: Optional[int] = None
+    confidence: Optional[float] = None      # lowest OCR confidence of those lines, None without confidences
+
+    def complete(self) -> bool:
+        return bool(self.action and self.datetime and self.location_folder)
+
+class ScreenshotClassifier:
+    """Single pass over the OCR lines: action, person name, datetime and location together.
+
+    All lines are scored against all action phrases with one cdist call.
+    """
+
+    def __init__(self, reanimation_matcher: LocationMatcher, simple_matcher: LocationMatcher = SIMPLE_LOCATION_MATCHER):
+        self.reanimation_matcher = reanimation_matcher
+        self.simple_matcher = simple_matcher
+
+    def classify(self, text: str, confidences: Optional[list] = None) -> Classification:
+        """confidences: OCR confidence per line of text, used to fill in result.confidence."""
+        result = Classification()
+        lines = text.splitlines()
+        if not lines:
+            return result
+        result.action, result.name, result.action_line = match_action(lines, action_scores(lines))
+        result.datetime, result.time_of_day, first, last = find_datetime(text)
+        if first is not None:
+            result.datetime_lines = (first, last)
+        matcher = None
+        if result.action == "reanimation":
+            matcher = self.reanimation_matcher
+        elif result.action:
+            matcher = self.simple_matcher
+        if matcher is not None:
+            result.location, result.location_folder, result.location_score, result.location_line = matcher.locate(text)
+        if confidences is not None:
+            used = [i for i in (result.action_line, result.location_line) if i is not None]
+            if result.datetime_lines:
+                used.extend(range(result.datetime_lines[0], result.datetime_lines[1] + 1))
+            used_conf = [confidences[i] for i in used if i < len(confidences)]
+            result.confidence = min(used_conf) if used_conf else None
+        return result
+
+# === ROI ПРОФИЛИ ===
+# Named screen regions (x0, y0, x1, y1) per resolution. Only these crops are
+# OCR'd; their text is stitched together in the order listed here.
+ROI_PROFILES = {
+    "1920x1080": {
+        "chat": (0, 0, 760, 420),
+        "location": (0, 820, 560, 1080),
+        "clock": (1560, 0, 1920, 160),
+        "taskbar": (1500, 940, 1920, 1080),
+    },
+    "2560x1080": {
+        "chat": (0, 0, 760, 420),
+        "location": (0, 820, 560, 1080),
+        "clock": (2200, 0, 2560, 160),
+        "taskbar": (2140, 940, 2560, 1080),
+    },
+}
+
+# Early-exit reading order: the chat line has action and name, then the HUD location, then the clocks
+REGION_PRIORITY = ('chat', 'location', 'clock', 'taskbar')
+
+def load_roi_profiles(json_path: Optional[str] = None) -> dict:
+    profiles = {name: dict(regions) for name, regions in ROI_PROFILES.items()}
+    if json_path:
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for name, regions in data.items():
+                profiles[name] = {region: tuple(rect) for region, rect in regions.items()}
+        except Exception as e:
+            logging.error(f"Failed to load ROI profiles from {json_path}: {e}")
+    return profiles
+
+def pick_roi_profile(width: int, height: int, profiles: dict) -> Tuple[Optional[str], Optional[dict]]:
+    """Return the profile for this resolution, scaling one with the same aspect ratio if needed."""
+    exact = f"{width}x{height}"
+    if exact in profiles:
+        return exact, profiles[exact]
+    for name, regions in profiles.items():
+        try:
+            base_w, base_h = (int(v) for v in name.split('x'))
+        except ValueError:
+            continue
+        if abs(base_w / base_h - width / height) > 0.01:
+            continue
+        sx, sy = width / base_w, height / base_h
+        scaled = {
+            region: (round(x0 * sx), round(y0 * sy), round(x1 * sx), round(y1 * sy))
+            for region, (x0, y0, x1, y1) in regions.items()
+        }
+        return name, scaled
     return None, None
 
+def resolve_roi(image: np.ndarray, roi_profile: str, profiles: dict) -> Tuple[Optional[str], Optional[dict]]:
+    if roi_profile == 'off':
+        return None, None
+    height, width = image.shape[:2]
+    if roi_profile == 'auto':
+        return pick_roi_profile(width, height, profiles)
+    if roi_profile not in profiles:
+        raise ValueError(f"Unknown ROI profile: {roi_profile}")
+    return pick_roi_profile(width, height, {roi_profile: profiles[roi_profile]})
+
+def load_image(image_path: str) -> np.ndarray:
+    with open_input(image_path) as f:
+        return decode_image(f)
+
+def decode_image(f) -> np.ndarray:
+    """RGB array of an image file object (a file, an archive member, an HTTP upload)."""
+    from PIL import Image
+    with Image.open(f) as img:
+        return np.asarray(img.convert('RGB'))
+
+# === ПРЕДОБРАБОТКА ===
+# Steps applied to each decoded ROI crop before it reaches easyocr, per region name
+# ('*' is the default, 'full' is the whole image when no ROI profile matches):
+#   gray      - single channel, easyocr skips its own colour conversion
+#   scale     - resize factor (<1 faster, >1 helps the small chat font)
+#   threshold - adaptive binarization, for the chat overlay on a busy background
+PREPROCESS_PRESETS = {
+    "none": {},
+    "gray": {"*": {"gray": True}},
+    "fast": {"*": {"gray": True, "scale": 0.75}},
+    "upscale": {"*": {"gray": True, "scale": 1.5}},
+    "chat-binarize": {"*": {"gray": True}, "chat": {"gray": True, "scale": 1.5, "threshold": True}},
+}
+DEFAULT_PREPROCESS = 'none'
+
+def load_preprocess_presets(json_path: Optional[str] = None) -> dict:
+    presets = {name: {region: dict(steps) for region, steps in preset.items()} for name, preset in PREPROCESS_PRESETS.items()}
+    if json_path:
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                presets.update(json.load(f))
+        except Exception as e:
+            logging.error(f"Failed to load preprocessing presets from {json_path}: {e}")
+    return presets
+
+def resolve_preprocess(preprocess, presets: Optional[dict] = None) -> dict:
+    """Accept a preset name or an already resolved preset dict."""
+    if isinstance(preprocess, dict):
+        return preprocess
+    presets = presets if presets is not None else PREPROCESS_PRESETS
+    if preprocess not in presets:
+        raise ValueError(f"Unknown preprocessing preset: {preprocess}")
+    return presets[preprocess]
+
+def preprocess_crop(crop: np.ndarray, steps: dict) -> Tuple[np.ndarray, float]:
+    """Apply one region's steps; returns the new array and the scale to map boxes back."""
+    if not steps:
+        return np.ascontiguousarray(crop), 1.0  # a copy, so the decoded frame can be freed
+    import cv2
+    scale = float(steps.get('scale', 1.0))
+    if steps.get('gray') or steps.get('threshold'):
+        if crop.ndim == 3:
+            crop = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+    if scale != 1.0:
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+        crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=interpolation)
+    if steps.get('threshold'):
+        block = int(steps.get('block_size', 31)) | 1
+        crop = cv2.adaptiveThreshold(crop, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                                     block, float(steps.get('c', -10)))
+    return np.ascontiguousarray(crop), scale
+
+def _readtext_batch(reader, crops) -> list:
+    if hasattr(reader, 'readtext_batch'):
+        return reader.readtext_batch(crops)
+    return [reader.readtext(crop) for crop in crops]
+
+def prepare_crops(image: np.ndarray, roi_profile: str = 'auto', profiles: Optional[dict] = None,
+                  preprocess: Optional[dict] = None, priority: bool = False) -> Tuple[list, list]:
+    """The preprocessed ROI crops of a screenshot (the whole image without a matching profile) and
+    their (x0, y0, scale) offsets. priority orders them by REGION_PRIORITY."""
+    preprocess = preprocess or {}
+    _, regions = resolve_roi(image, roi_profile, profiles if profiles is not None else ROI_PROFILES)
+    height, width = image.shape[:2]
+    if not regions:
+        regions = {'full': (0, 0, width, height)}
+    elif priority:
+        rank = {region: i for i, region in enumerate(REGION_PRIORITY)}
+        regions = dict(sorted(regions.items(), key=lambda item: rank.get(item[0], len(rank))))
+    crops, offsets = [], []
+    for region, (x0, y0, x1, y1) in regions.items():
+        x0, x1 = max(0, x0), min(width, x1)
+        y0, y1 = max(0, y0), min(height, y1)
+        if x1 <= x0 or y1 <= y0:
+            continue
+        crop, scale = preprocess_crop(image[y0:y1, x0:x1], preprocess.get(region, preprocess.get('*', {})))
+        crops.append(crop)
+        offsets.append((x0, y0, scale))
+    return crops, offsets
+
+def to_image_coordinates(offsets: list, batch: list) -> list:
+    """Per-crop backend results -> (box, text, confidence) tuples in full-image coordinates."""
+    results = []
+    for (x0, y0, scale), lines in zip(offsets, batch):
+        for box, text, conf in lines:
+            box = [[float(x) / scale + x0, float(y) / scale + y0] for x, y in box]
+            results.append((box, text, conf))
+    return results
+
+def read_prepared(reader, prepared: list) -> list:
+    """OCR the prepare_crops() output of several screenshots with one backend call for all crops.
+
+    A cascade still decides per screenshot: only the ones the primary engine got no action/date
+    from are re-read, together, by the fallback.
+    """
+    def read(engine, indices):
+        batch = _readtext_batch(engine, [crop for i in indices for crop in prepared[i][0]])
+        out, pos = {}, 0
+        for i in indices:
+            out[i] = batch[pos:pos + len(prepared[i][0])]
+            pos += len(prepared[i][0])
+        return out
+
+    if isinstance(reader, CascadeBackend):
+        batches = read(reader.primary, range(len(prepared)))
+        rejected = [i for i, lines in batches.items()
+                    if not reader.accept(text for crop_lines in lines for _, text, _ in crop_lines)]
+        if rejected:
+            logging.info(f"{reader.primary.name} found no action/date in {len(rejected)} screenshot(s), "
+                         f"retrying with {reader.fallback.name}")
+            batches.update(read(reader.fallback, rejected))
+    else:
+        batches = read(reader, range(len(prepared)))
+    return [to_image_coordinates(prepared[i][1], batches[i]) for i in range(len(prepared))]
+
+def ocr_image(reader, image_path: str, roi_profile: str = 'auto', profiles: Optional[dict] = None,
+              preprocess: Optional[dict] = None, early_exit=None, image: Optional[np.ndarray] = None,
+              timings: Optional[dict] = None):
+    """OCR one screenshot, restricted to the ROI crops when a profile matches its size.
+
+    The file is decoded once; each crop goes through its preprocessing steps as a numpy array.
+    All crops go to the backend as one batch. With early_exit (a callable taking the (text, conf)
+    lines read so far) the regions are read one by one in REGION_PRIORITY order until it returns True.
+    Returns (box, text, confidence) tuples with boxes in full-image coordinates.
+    An already decoded image can be passed as image. timings, if given, receives the 'decode' and
+    'ocr' seconds.
+    """
+    start = time.perf_counter()
+    image = image if image is not None else load_image(image_path)
+    decoded = time.perf_counter()
+    crops, offsets = prepare_crops(image, roi_profile, profiles, preprocess, priority=early_exit is not None)
+    image = None  # only the crops are needed now, free the frame before the model allocates
+    if early_exit is None:
+        batch = _readtext_batch(reader, crops)
+    else:
+        # a cascade gets the same treatment per engine: the fallback only runs if the primary never satisfied it
+        engines = [reader.primary, reader.fallback] if isinstance(reader, CascadeBackend) else [reader]
+        for engine in engines:
+            batch = []
+            for crop in crops:
+                batch.extend(_readtext_batch(engine, [crop]))
+                if early_exit([(text, conf) for lines in batch for _, text, conf in lines]):
+                    break
+            else:
+                continue
+            break
+    results = to_image_coordinates(offsets, batch)
+    if timings is not None:
+        timings['decode'] = decoded - start
+        timings['ocr'] = time.perf_counter() - decoded
+    return results
+
+# === OCR ENGINE (LAZY) ===
+# easyocr pulls in torch, torchvision, scipy and skimage: seconds of import time. It is only
+# imported when an image really has to be OCR'd, so --help, --skip-ocr, cache hits and the
+# "Count Points" button never pay for it.
+OCR_LANGUAGES = ['en', 'ru']
+TESSERACT_LANGUAGES = 'eng+rus'
+OCR_BACKENDS = ('easyocr', 'tesseract', 'cascade', 'remote')
+DEFAULT_SERVE_ADDRESS = '127.0.0.1:8765'  # --serve, and the remote backend's default server
+
+class OcrBackend(ABC):
+    """Batch of decoded images (numpy arrays) in, per image a list of (box, text, confidence) out.
+
+    Boxes are four [x, y] corners like easyocr's. Models are loaded on first use or by load().
+    """
+    name = 'base'
+
+    def load(self):
+        return self
+
+    @abstractmethod
+    def readtext(self, image) -> list:
+        ...
+
+    def readtext_batch(self, images) -> list:
+        return [self.readtext(image) for image in images]
+
+    @abstractmethod
+    def version(self) -> str:
+        ...
+
+class EasyOcrBackend(OcrBackend):
+    """easyocr Reader. With onnx_detector the CRAFT text detector runs on ONNX Runtime; the
+    recognizer (variable-width CRNN + LSTM) stays on torch."""
+    name = 'easyocr'
+
+    def __init__(self, languages=OCR_LANGUAGES, onnx_detector: Optional[str] = None):
+        self.languages = list(languages)
+        self.onnx_detector = onnx_detector
+        self.reader = None
+
+    def load(self):
+        if self.reader is None:
+            import easyocr
+            reader = easyocr.Reader(self.languages)
+            if self.onnx_detector:
+                try:
+                    reader.detector = OnnxDetector.from_torch(reader.detector, self.onnx_detector)
+                    logging.info(f"easyocr detector running on ONNX Runtime ({self.onnx_detector})")
+                except Exception as e:
+                    logging.error(f"ONNX detector unavailable, using torch: {e}")
+                    self.onnx_detector = None
+            self.reader = reader
+        return self
+
+    def readtext(self, image) -> list:
+        return self.load().reader.readtext(image)
+
+    def readtext_batch(self, images) -> list:
+        """Same-shaped images (one ROI region of several screenshots) share one readtext_batched
+        call: the detector runs on them as one tensor."""
+        reader = self.load().reader
+        results = [None] * len(images)
+        groups = {}
+        for i, image in enumerate(images):
+            groups.setdefault(image.shape, []).append(i)
+        for indices in groups.values():
+            if len(indices) == 1:
+                results[indices[0]] = reader.readtext(images[indices[0]])
+                continue
+            for i, lines in zip(indices, reader.readtext_batched([images[i] for i in indices])):
+                results[i] = lines
+        return results
+
+    def version(self) -> str:
+        from importlib import metadata
+        try:
+            version = metadata.version('easyocr')
+        except metadata.PackageNotFoundError:
+            import easyocr
+            version = getattr(easyocr, '__version__', 'unknown')
+        return f"easyocr {version} {'+'.join(self.languages)}" + (' onnx-detector' if self.onnx_detector else '')
+
+class OnnxDetector:
+    """Drop-in for easyocr's CRAFT module: same (y, feature) tensors, computed by onnxruntime."""
+
+    def __init__(self, session):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+
+    @classmethod
+    def from_torch(cls, detector, onnx_path: str):
+        import onnxruntime
+        if not os.path.exists(onnx_path):
+            import torch
+            module = getattr(detector, 'module', detector)  # unwrap DataParallel
+            dummy = torch.randn(1, 3, 640, 640)
+            torch.onnx.export(module, dummy, onnx_path, input_names=['image'], output_names=['y', 'feature'],
+                              dynamic_axes={'image': {0: 'batch', 2: 'height', 3: 'width'},
+                                            'y': {0: 'batch', 1: 'height', 2: 'width'},
+                                            'feature': {0: 'batch', 2: 'height', 3: 'width'}},
+                              opset_version=17)
+            logging.info(f"Exported easyocr detector to {onnx_path}")
+        return cls(onnxruntime.InferenceSession(onnx_path, providers=['CPUExecutionProvider']))
+
+    def __call__(self, x):
+        import torch
+        y, feature = self.session.run(None, {self.input_name: x.detach().cpu().numpy()})
+        return torch.from_numpy(y), torch.from_numpy(feature)
+
+    def eval(self):
+        return self
+
+class TesseractBackend(OcrBackend):
+    """pytesseract on the crops; words are grouped back into lines with their union box."""
+    name = 'tesseract'
+
+    def __init__(self, languages: str = TESSERACT_LANGUAGES, tesseract_cmd: Optional[str] = None, psm: int = 6):
+        self.languages = languages
+        self.tesseract_cmd = tesseract_cmd
+        self.psm = psm
+        self.pytesseract = None
+
+    def load(self):
+        if self.pytesseract is None:
+            import pytesseract
+            if self.tesseract_cmd:
+                pytesseract.pytesseract.tesseract_cmd = self.tesseract_cmd
+            self.pytesseract = pytesseract
+        return self
+
+    def readtext(self, image) -> list:
+        pytesseract = self.load().pytesseract
+        data = pytesseract.image_to_data(image, lang=self.languages, config=f'--psm {self.psm}',
+                                         output_type=pytesseract.Output.DICT)
+        lines = {}
+        for i, word in enumerate(data['text']):
+            conf = float(data['conf'][i])
+            if conf < 0 or not word.strip():
+                continue
+            key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            lines.setdefault(key, []).append(
+                (data['left'][i], data['top'][i], data['width'][i], data['height'][i], word, conf))
+        results = []
+        for words in lines.values():
+            x0 = min(w[0] for w in words)
+            y0 = min(w[1] for w in words)
+            x1 = max(w[0] + w[2] for w in words)
+            y1 = max(w[1] + w[3] for w in words)
+            text = ' '.join(w[4] for w in words)
+            conf = sum(w[5] for w in words) / len(words) / 100
+            results.append(([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], text, conf))
+        return results
+
+    def version(self) -> str:
+        try:
+            version = str(self.load().pytesseract.get_tesseract_version())
+        except Exception as e:
+            version = f"unknown ({e})"
+        return f"tesseract {version} {self.languages} psm{self.psm}"
+
+def has_action_and_date(lines) -> bool:
+    lines = list(lines)
+    if not lines:
+        return False
+    action, _, _ = match_action(lines, action_scores(lines))
+    return action is not None and extract_datetime('\n'.join(lines))[0] is not None
+
+class CascadeBackend(OcrBackend):
+    """Cheap primary engine first; the fallback re-reads the batch only when accept() rejects the text.
+
+    A batch is one screenshot's crops, so the decision is made per screenshot.
+    """
+    name = 'cascade'
+
+    def __init__(self, primary: OcrBackend, fallback: OcrBackend, accept=has_action_and_date):
+        self.primary = primary
+        self.fallback = fallback
+        self.accept = accept
+
+    def load(self):
+        self.primary.load()
+        self.fallback.load()
+        return self
+
+    def readtext(self, image) -> list:
+        return self.readtext_batch([image])[0]
+
+    def readtext_batch(self, images) -> list:
+        results = self.primary.readtext_batch(images)
+        if self.accept(text for lines in results for _, text, _ in lines):
+            return results
+        logging.info(f"{self.primary.name} found no action/date, retrying with {self.fallback.name}")
+        return self.fallback.readtext_batch(images)
+
+    def version(self) -> str:
+        return f"cascade({self.primary.version()}; {self.fallback.version()})"
+
+class RemoteBackend(OcrBackend):
+    """OCR on a --serve instance: each image is POSTed as PNG to <url>/readtext. A batch is sent
+    concurrently so the server reads it in one micro-batch; busy (503) answers and refused or
+    reset connections (a server still starting or restarting) are retried."""
+    name = 'remote'
+
+    def __init__(self, url: str = f"http://{DEFAULT_SERVE_ADDRESS}", timeout: float = 120, retries: int = 5):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+
+    def _request(self, path: str, data: Optional[bytes] = None) -> dict:
+        import urllib.error
+        import urllib.request
+        for attempt in range(self.retries + 1):
+            request = urllib.request.Request(self.url + path, data=data,
+                                             headers={'Content-Type': 'image/png'} if data is not None else {})
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    return json.loads(response.read().decode('utf-8'))
+            except urllib.error.HTTPError as e:
+                if e.code != 503 or attempt == self.retries:
+                    raise RuntimeError(f"OCR server {self.url}: HTTP {e.code} {e.read().decode('utf-8', 'replace')}")
+                time.sleep(float(e.headers.get('Retry-After') or 1))
+            except (urllib.error.URLError, ConnectionError) as e:
+                reason = getattr(e, 'reason', e)
+                if attempt == self.retries:
+                    raise RuntimeError(f"OCR server {self.url} is not reachable: {reason}") from e
+                time.sleep(min(2 ** attempt, 10))
+        raise AssertionError('unreachable')
+
+    def readtext(self, image) -> list:
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.fromarray(image).save(buffer, 'PNG', compress_level=1)
+        lines = self._request('/readtext', buffer.getvalue())['lines']
+        return [(line['box'], line['text'], line['conf']) for line in lines]
+
+    def readtext_batch(self, images) -> list:
+        if len(images) <= 1:
+            return [self.readtext(image) for image in images]
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(len(images)) as pool:
+            return list(pool.map(self.readtext, images))
+
+    def version(self) -> str:
+        return f"remote {self.url} ({self._request('/health')['engine']})"
+
+def create_backend(name: str = 'easyocr', tesseract_cmd: Optional[str] = None,
+                   onnx_detector: Optional[str] = None, server_url: Optional[str] = None) -> OcrBackend:
+    if name == 'remote':
+        return RemoteBackend(server_url or f"http://{DEFAULT_SERVE_ADDRESS}")
+    if name == 'easyocr':
+        return EasyOcrBackend(onnx_detector=onnx_detector)
+    if name == 'tesseract':
+        return TesseractBackend(tesseract_cmd=tesseract_cmd)
+    if name == 'cascade':
+        return CascadeBackend(TesseractBackend(tesseract_cmd=tesseract_cmd), EasyOcrBackend(onnx_detector=onnx_detector))
+    raise ValueError(f"Unknown OCR backend: {name}")
+
+class WarmReader:
+    """Loads an OCR backend in a background thread (e.g. while the GUI is idle); get() waits for it."""
+
+    def __init__(self, backend: str = 'easyocr', **options):
+        self.backend = create_backend(backend, **options)
+        self.error = None
+        self.thread = threading.Thread(target=self._load, daemon=True)
+        self.thread.start()
+
+    def _load(self):
+        try:
+            self.backend.load()
+            logging.info("OCR model loaded")
+        except Exception as e:
+            self.error = e
+
+    def ready(self) -> bool:
+        return not self.thread.is_alive()
+
+    def get(self) -> OcrBackend:
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.backend
+
+# === EARLY EXIT ===
+# Review routing is opt-in: no threshold has been measured yet (bench-preprocess.py /
+# bench-synthetic.py report accuracy per preset), and a screenshot in review/ scores no points
+DEFAULT_MIN_CONFIDENCE = 0.0
+
+class EarlyExit:
+    """Stop reading regions once action, date and location are found, each on a line read
+    with at least min_confidence."""
+
+    def __init__(self, classifier: ScreenshotClassifier, min_confidence: float = DEFAULT_MIN_CONFIDENCE):
+        self.classifier = classifier
+        self.min_confidence = min_confidence
+
+    def __call__(self, lines) -> bool:
+        result = self.classifier.classify('\n'.join(text for text, _ in lines), [conf for _, conf in lines])
+        return result.complete() and result.confidence is not None and result.confidence >= self.min_confidence
+
+    def fingerprint(self) -> str:
+        matcher = self.classifier.reanimation_matcher
+        return f"{self.min_confidence}:{rules_fingerprint(dict(zip(matcher.names, matcher.values)))}"
+
+# === ПАМЯТЬ ===
+def process_tree_rss() -> Optional[int]:
+    """Resident bytes of this process plus its child processes (the OCR workers), None if unknown.
+
+    psutil when installed, else /proc (Linux).
+    """
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        me = psutil.Process()
+        total = 0
+        for proc in [me] + me.children(recursive=True):
+            try:
+                total += proc.memory_info().rss
+            except psutil.Error:
+                pass  # exited meanwhile
+        return total
+    if not os.path.exists('/proc/self/statm'):
+        return None
+    import multiprocessing
+    page = os.sysconf('SC_PAGE_SIZE')
+    total = 0
+    for pid in ['self'] + [str(child.pid) for child in multiprocessing.active_children()]:
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                total += int(f.read().split()[1]) * page
+        except (OSError, IndexError, ValueError):
+            pass
+    return total
+
+class MemoryGuard:
+    """--max-memory: while this process and its workers are above limit_mb, the OCR pool gets one
+    image at a time instead of a full queue. Idle workers keep their model loaded, so pick
+    --workers so the models alone fit."""
+
+    def __init__(self, limit_mb: Optional[float]):
+        self.limit = int(limit_mb * 1024 * 1024) if limit_mb else None
+        self.throttled = False
+        if self.limit and process_tree_rss() is None:
+            logging.warning("--max-memory needs psutil on this system (pip install psutil), ignoring it")
+            self.limit = None
+
+    def over(self) -> bool:
+        if not self.limit:
+            return False
+        rss = process_tree_rss()
+        over = rss is not None and rss > self.limit
+        if over != self.throttled:
+            self.throttled = over
+            if over:
+                logging.warning(f"Memory {rss / 1024 / 1024:.0f} MB above --max-memory, OCR one image at a time")
+            else:
+                logging.info("Memory back under --max-memory, OCR workers resume")
+        return over
+
+# === OCR WORKER POOL ===
+
+_worker_reader = None
+_worker_roi = None
+_worker_backend = None
+
+def torch_threads_per_worker(workers: int) -> int:
+    """Split the CPU cores between workers so N torch/OpenMP pools don't oversubscribe them."""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+def _init_ocr_worker(threads: int, roi_profile: str, profiles: dict, preprocess: dict,
+                     backend: str, backend_options: dict, early_exit: Optional[EarlyExit], log_queue):
+    # Only stores the settings: an exception here makes multiprocessing.Pool respawn the
+    # worker forever, so the backend is loaded by the first task, which can report the error
+    global _worker_roi, _worker_backend
+    log_to_queue(log_queue)
+    os.environ['OMP_THREAD_LIMIT'] = str(threads)  # tesseract's OpenMP pool
+    _worker_roi = (roi_profile, profiles, preprocess, early_exit)
+    _worker_backend = (threads, backend, backend_options)
+
+def _load_worker_reader():
+    """The worker's backend, loaded on first use; a failed load is raised again for every task."""
+    global _worker_reader
+    if _worker_reader is None:
+        threads, backend, backend_options = _worker_backend
+        try:
+            if backend in ('easyocr', 'cascade'):
+                import torch
+                torch.set_num_threads(threads)
+                try:
+                    torch.set_num_interop_threads(1)
+                except RuntimeError:
+                    pass  # already set by torch itself in this process
+            _worker_reader = create_backend(backend, **backend_options).load()
+        except Exception as e:
+            _worker_reader = e
+    if isinstance(_worker_reader, Exception):
+        raise _worker_reader
+    return _worker_reader
+
+def _ocr_worker_task(image_path: str):
+    roi_profile, profiles, preprocess, early_exit = _worker_roi
+    timings = {}
+    try:
+        results = ocr_image(_load_worker_reader(), image_path, roi_profile, profiles, preprocess, early_exit,
+                            timings=timings)
+        return image_path, results, None, timings
+    except Exception as e:
+        return image_path, None, e, timings
+
+def iter_ocr_results(image_paths, workers: int = 1, roi_profile: str = 'auto', profiles: Optional[dict] = None,
+                     reader=None, preprocess: Optional[dict] = None,
+                     backend: str = 'easyocr', backend_options: Optional[dict] = None,
+                     early_exit: Optional[EarlyExit] = None, memory: Optional[MemoryGuard] = None):
+    """Yield (image_path, results, error, timings) for every image, in completion order.
+
+    With workers > 1 each process loads the Reader once; at most two images per worker are queued
+    or in flight (one while memory is over its limit), so results and decoded images never pile up.
+    A given backend (or WarmReader) kept warm by the caller is used in-process instead.
+    """
+    profiles = profiles if profiles is not None else ROI_PROFILES
+    if not image_paths:
+        return
+    if workers <= 1 or reader is not None:
+        if isinstance(reader, WarmReader):
+            reader = reader.get()
+        reader = reader if reader is not None else create_backend(backend, **(backend_options or {}))
+        for image_path in image_paths:
+            timings = {}
+            try:
+                results = ocr_image(reader, image_path, roi_profile, profiles, preprocess, early_exit, timings=timings)
+                yield image_path, results, None, timings
+            except Exception as e:
+                yield image_path, None, e, timings
+        return
+    import multiprocessing
+    workers = min(workers, len(image_paths))
+    init_args = (torch_threads_per_worker(workers), roi_profile, profiles, preprocess or {},
+                 backend, backend_options or {}, early_exit, worker_log_queue())
+    import queue
+    done = queue.Queue()
+    paths = iter(image_paths)
+    in_flight = 0
+    with multiprocessing.Pool(workers, initializer=_init_ocr_worker, initargs=init_args) as pool:
+        while True:
+            while in_flight < workers * 2 and not (in_flight and memory is not None and memory.over()):
+                image_path = next(paths, None)
+                if image_path is None:
+                    break
+                pool.apply_async(_ocr_worker_task, (image_path,), callback=done.put,
+                                 error_callback=lambda e, p=image_path: done.put((p, None, e, {})))
+                in_flight += 1
+            if not in_flight:
+                return
+            yield done.get()
+            in_flight -= 1
+
+# === ДУБЛИКАТЫ ===
+# Several screenshots of one event look almost the same. A perceptual hash (dHash of the whole
+# frame plus a finer one of the chat region) groups them before OCR; only the first of each group
+# is OCR'd and the rest reuse its text. Distance is in differing bits out of PHASH_BITS.
+# Off (-1) by default: a different name in the chat line flips only a few bits, about as many as
+# re-saving the screenshot as JPEG, and clock digits are below the hash resolution altogether.
+DEFAULT_NEAR_DUPLICATE_DISTANCE = -1
+PHASH_BITS = 64 + 256
+
+def _dhash(gray, width: int, height: int) -> int:
+    from PIL import Image
+    pixels = np.asarray(gray.resize((width + 1, height), Image.BILINEAR), dtype=np.int16)
+    bits = np.packbits((pixels[:, 1:] > pixels[:, :-1]).flatten())
+    return int.from_bytes(bits.tobytes(), 'big')
+
+def perceptual_hash(image_path: str, profiles: Optional[dict] = None) -> int:
+    """8x8 dHash of the frame and 16x16 dHash of the chat ROI (or the frame) as one PHASH_BITS int."""
+    from PIL import Image
+    with open_input(image_path) as f, Image.open(f) as img:
+        width, height = img.size
+        img.draft('L', (width // 4, height // 4))  # JPEG decodes at reduced size, PNG ignores it
+        gray = img.convert('L')
+    _, regions = pick_roi_profile(width, height, profiles if profiles is not None else ROI_PROFILES)
+    chat = gray
+    if regions and 'chat' in regions:
+        sx, sy = gray.width / width, gray.height / height
+        x0, y0, x1, y1 = regions['chat']
+        chat = gray.crop((round(x0 * sx), round(y0 * sy), round(x1 * sx), round(y1 * sy)))
+    return (_dhash(gray, 8, 8) << 256) | _dhash(chat, 16, 16)
+
+def cluster_near_duplicates(hashes: list, max_distance: int) -> list:
+    """Leader clustering: for every hash the index of the first earlier hash within max_distance
+    bits (itself if none). Candidates come from a band index: split into max_distance + 1 bands,
+    two hashes that close must share at least one band exactly."""
+    if max_distance < 0:
+        return list(range(len(hashes)))
+    bands = max_distance + 1
+    width = -(-PHASH_BITS // bands)
+    mask = (1 << width) - 1
+    index = [{} for _ in range(bands)]
+    leaders = []
+    for i, h in enumerate(hashes):
+        leader = None
+        if h is not None:
+            parts = [(h >> (b * width)) & mask for b in range(bands)]
+            for b, part in enumerate(parts):
+                for j in index[b].get(part, ()):
+                    if bin(h ^ hashes[j]).count('1') <= max_distance:
+                        leader = j
+                        break
+                if leader is not None:
+                    break
+            if leader is None:
+                for b, part in enumerate(parts):
+                    index[b].setdefault(part, []).append(i)
+        leaders.append(i if leader is None else leader)
+    return leaders
+
+# === OCR КЭШ ===
+DEFAULT_CACHE_PATH = 'ocr-cache.sqlite'
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open_input(path) as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def ocr_settings_fingerprint(roi_profile: str, profiles: dict, preprocess: Optional[dict] = None,
+                             engine: str = '', early_exit: Optional[str] = None,
+                             near_duplicate_distance: int = -1) -> str:
+    """Everything besides the pixels that changes the OCR output."""
+    settings = {
+        'near_duplicates': near_duplicate_distance,
+        'early_exit': early_exit,
+        'preprocess': preprocess or {},
+        'languages': OCR_LANGUAGES,
+        'roi_profile': roi_profile,
+        'roi_profiles': {name: {r: list(rect) for r, rect in regions.items()} for name, regions in profiles.items()},
+        'engine': engine,
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+class OcrCache:
+    """SQLite cache of OCR lines (box, text, confidence) keyed by image hash + OCR settings."""
+
+    def __init__(self, path: str, max_size_mb: Optional[float] = None):
+        self.path = path
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache ("
+            " key TEXT PRIMARY KEY, image_hash TEXT, settings TEXT,"
+            " lines TEXT, size INTEGER, last_used REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ocr_cache_last_used ON ocr_cache (last_used)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_hashes ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, image_hash TEXT)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS perceptual_hashes ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, variant TEXT, phash TEXT)"
+        )
+        self.conn.commit()
+
+    def image_hash(self, entry: ImageEntry) -> str:
+        """Content hash of an image, recomputed only when its size or mtime changed since the last run."""
+        path = os.path.abspath(entry.path)
+        row = self.conn.execute("SELECT size, mtime_ns, image_hash FROM file_hashes WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == entry.size and row[1] == entry.mtime_ns:
+            return row[2]
+        image_hash = file_sha256(entry.path)
+        self.conn.execute("INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, image_hash) VALUES (?, ?, ?, ?)",
+                          (path, entry.size, entry.mtime_ns, image_hash))
+        return image_hash
+
+    def perceptual_hash(self, entry: ImageEntry, profiles: dict, variant: str) -> int:
+        """perceptual_hash() of an image, reused while its stat and the ROI profiles (variant) are unchanged."""
+        path = os.path.abspath(entry.path)
+        row = self.conn.execute("SELECT size, mtime_ns, variant, phash FROM perceptual_hashes WHERE path = ?",
+                                (path,)).fetchone()
+        if row and (row[0], row[1], row[2]) == (entry.size, entry.mtime_ns, variant):
+            return int(row[3], 16)
+        phash = perceptual_hash(entry.path, profiles)
+        self.conn.execute("INSERT OR REPLACE INTO perceptual_hashes (path, size, mtime_ns, variant, phash)"
+                          " VALUES (?, ?, ?, ?, ?)", (path, entry.size, entry.mtime_ns, variant, f"{phash:x}"))
+        return phash
+
+    @staticmethod
+    def make_key(image_hash: str, settings: str) -> str:
+        return f"{image_hash}:{settings}"
+
+    def get(self, key: str) -> Optional[list]:
+        row = self.conn.execute("SELECT lines FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.conn.execute("UPDATE ocr_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        return [(line['box'], line['text'], line['conf']) for line in json.loads(row[0])]
+
+    def put(self, key: str, results):
+        image_hash, settings = key.split(':', 1)
+        lines = json.dumps([
+            {'box': [[float(x), float(y)] for x, y in box], 'text': text, 'conf': float(conf)}
+            for box, text, conf in results
+        ], ensure_ascii=False)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO ocr_cache (key, image_hash, settings, lines, size, last_used)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (key, image_hash, settings, lines, len(lines.encode('utf-8')), time.time()),
+        )
+
+    def prune(self, max_size_bytes: Optional[int] = None, max_age_days: Optional[float] = None) -> int:
+        """Drop entries older than max_age_days, then least recently used ones until under max_size_bytes."""
+        removed = 0
+        if max_age_days is not None:
+            cutoff = time.time() - max_age_days * 86400
+            removed += self.conn.execute("DELETE FROM ocr_cache WHERE last_used < ?", (cutoff,)).rowcount
+        max_size_bytes = max_size_bytes if max_size_bytes is not None else self.max_size_bytes
+        if max_size_bytes is not None:
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+            stale = []
+            for key, size in self.conn.execute("SELECT key, size FROM ocr_cache ORDER BY last_used"):
+                if total <= max_size_bytes:
+                    break
+                stale.append((key,))
+                total -= size
+            self.conn.executemany("DELETE FROM ocr_cache WHERE key = ?", stale)
+            removed += len(stale)
+        self.conn.commit()
+        return removed
+
+    def close(self):
+        if self.max_size_bytes is not None:
+            self.prune()
+        self.conn.commit()
+        self.conn.close()
+
+def meta_path_for(txt_path: str) -> str:
+    return os.path.splitext(txt_path)[0] + '.meta.json'
+
+def read_confidences(txt_path: str) -> Optional[list]:
+    """Per-line OCR confidences saved next to the text, None for texts written without them."""
+    try:
+        with open(meta_path_for(txt_path), 'r', encoding='utf-8') as f:
+            return json.load(f).get('confidences')
+    except (OSError, ValueError):
+        return None
+
+def write_text_output(txt_path: str, results):
+    """Write the text and its confidences sidecar. Unchanged outputs are left alone, so their
+    mtime keeps the sort manifest valid; both are rewritten if either changed."""
+    content = '\n'.join(text for _, text, _ in results)
+    meta = json.dumps({'confidences': [round(float(conf), 4) for _, _, conf in results]})
+    meta_path = meta_path_for(txt_path)
+    if os.path.exists(txt_path) and os.path.exists(meta_path):
+        with open(txt_path, 'r', encoding='utf-8') as f, open(meta_path, 'r', encoding='utf-8') as m:
+            if f.read() == content and m.read() == meta:
+                return
+    # the text goes last: its existence marks the screenshot as done
+    with atomic_open(meta_path) as f:
+        f.write(meta)
+    with atomic_open(txt_path) as f:
+        f.write(content)
+
+# === OCR STORE (JSON LINES) ===
+OCR_STORE_NAME = 'ocr.jsonl'
+TEXT_FORMATS = ('jsonl', 'txt', 'both')
+
+class OcrStore:
+    """All OCR results of a folder in one append-only ocr.jsonl, one record per line:
+    {"stem": ..., "lines": [{"box": ..., "text": ..., "conf": ...}, ...]}.
+
+    The last record of a stem wins. Opening indexes the file (stem -> byte range) in one pass;
+    records are read back on demand. close() compacts the file once superseded records dominate.
+    """
+
+    def __init__(self, folder: str):
+        self.path = os.path.join(folder, OCR_STORE_NAME)
+        self.index = {}      # stem -> (offset, length)
+        self.versions = {}   # stem -> (length, crc32) of its record, stands in for a text file's stat
+        self.records = 0
+        self.end = 0         # end of the last complete record
+        self.handle = None
+        if os.path.exists(self.path):
+            import zlib
+            with open(self.path, 'rb') as f:
+                for raw in f:
+                    if not raw.endswith(b'\n'):
+                        break  # torn write at the end, overwritten by the next put
+                    try:
+                        stem = json.loads(raw)['stem']
+                    except (ValueError, KeyError):
+                        self.end += len(raw)
+                        continue
+                    self.index[stem] = (self.end, len(raw))
+                    self.versions[stem] = (len(raw), zlib.crc32(raw))
+                    self.records += 1
+                    self.end += len(raw)
+
+    def __contains__(self, stem: str) -> bool:
+        return stem in self.index
+
+    @staticmethod
+    def encode(stem: str, results) -> bytes:
+        lines = [{'box': [[round(float(x), 1), round(float(y), 1)] for x, y in box], 'text': text,
+                  'conf': round(float(conf), 4)} for box, text, conf in results]
+        return (json.dumps({'stem': stem, 'lines': lines}, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+    def put(self, stem: str, results):
+        import zlib
+        raw = self.encode(stem, results)
+        version = (len(raw), zlib.crc32(raw))
+        if self.versions.get(stem) == version:
+            return  # unchanged: keeps the sort manifest entry current
+        if self.handle is None:
+            self.handle = open(self.path, 'ab')
+            if self.handle.tell() != self.end:
+                self.handle.truncate(self.end)
+                self.handle.seek(self.end)
+        self.handle.write(raw)
+        self.index[stem] = (self.end, len(raw))
+        self.versions[stem] = version
+        self.records += 1
+        self.end += len(raw)
+
+    def flush(self, sync: bool = False):
+        """sync also forces the records to disk, before a run journal claims them."""
+        if self.handle is not None:
+            self.handle.flush()
+            if sync:
+                os.fsync(self.handle.fileno())
+
+    def iter_records(self, stems) -> Iterator[Tuple[str, list]]:
+        """Yield (stem, lines) for the given stems, reading the file through one handle."""
+        self.flush()
+        with open(self.path, 'rb') as f:
+            for stem in stems:
+                offset, length = self.index[stem]
+                f.seek(offset)
+                yield stem, json.loads(f.read(length))['lines']
+
+    def get(self, stem: str) -> Optional[list]:
+        if stem not in self.index:
+            return None
+        for _, lines in self.iter_records([stem]):
+            return [(line['box'], line['text'], line['conf']) for line in lines]
+
+    def compact(self, min_garbage: float = 0.5):
+        """Rewrite the file with only the live records when at least min_garbage of it is superseded."""
+        if self.records <= len(self.index) or (self.records - len(self.index)) / self.records < min_garbage:
+            return
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+        live = sorted(self.index.items(), key=lambda item: item[1][0])
+        index, end = {}, 0
+        with atomic_open(self.path, 'wb') as dst:
+            with open(self.path, 'rb') as src:  # closed before the rename, Windows won't replace an open file
+                for stem, (offset, length) in live:
+                    src.seek(offset)
+                    dst.write(src.read(length))
+                    index[stem] = (end, length)
+                    end += length
+        logging.info(f"Compacted {self.path}: {self.records} -> {len(index)} records")
+        self.index, self.records, self.end = index, len(index), end
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+        self.compact()
+
 # === OCR PART ===
-def ocr_images(input_dir: str, output_dir: str, force: bool = False):
+def ocr_images(input_dir: str, output_dir: str, force: bool = False,
+               roi_profile: str = 'auto', roi_config: Optional[str] = None,
+               workers: int = 1, progress=None,
+               cache_path: Optional[str] = DEFAULT_CACHE_PATH, cache_max_size: Optional[float] = None,
+               images: Optional[ImageIndex] = None, reader=None,
+               preprocess: str = DEFAULT_PREPROCESS, preprocess_config: Optional[str] = None,
+               ocr_backend: str = 'easyocr', backend_options: Optional[dict] = None,
+               early_exit: bool = False, location_py: Optional[str] = None,
+               min_confidence: float = DEFAULT_MIN_CONFIDENCE, text_format: str = 'jsonl',
+               metrics: Optional[RunMetrics] = None, cancel=None,
+               near_duplicate_distance: int = DEFAULT_NEAR_DUPLICATE_DISTANCE,
+               max_memory: Optional[float] = None, journal: Optional['RunJournal'] = None,
+               store: Optional['OcrStore'] = None, cache: Optional['OcrCache'] = None):
+    """OCR every image into output_dir/ocr.jsonl (text_format 'jsonl'), into <stem>.txt plus
+    per-line confidences in <stem>.meta.json ('txt'), or both.
+
+    With early_exit the regions are read in priority order and OCR stops once the classifier
+    (using location_py) has all fields above min_confidence. Setting cancel (a threading.Event)
+    raises Cancelled between images; texts already written are kept. Byte-identical images are
+    OCR'd once; so are near-identical ones (perceptual hash within near_duplicate_distance bits).
+    max_memory (MB) throttles the worker pool to one image at a time while the run uses more.
+    Every stored text is recorded in journal once it is on disk.
+    A store and cache opened by the caller (watch mode) are used as they are and left open.
+    """
     os.makedirs(output_dir, exist_ok=True)
-    image_paths = glob(os.path.join(input_dir, '*.png')) + glob(os.path.join(input_dir, '*.jpg'))
-    reader = easyocr.Reader(['en', 'ru'])
-    for image_path in image_paths:
-        image_name = os.path.splitext(os.path.basename(image_path))[0]
-        txt_path = os.path.join(output_dir, f"{image_name}.txt")
-        if not force and os.path.exists(txt_path):
-            logging.info(f"Skipping already processed: {image_path}")
+    metrics = metrics if metrics is not None else RunMetrics()
+    images = images if images is not None else ImageIndex(input_dir)
+    total = len(images)
+    metrics.count('images', total)
+    profiles = load_roi_profiles(roi_config)
+    preprocess = resolve_preprocess(preprocess, load_preprocess_presets(preprocess_config))
+    own_cache, own_store = cache is None, store is None
+    if own_cache:
+        cache = OcrCache(cache_path, cache_max_size) if cache_path else None
+    if isinstance(reader, WarmReader):
+        engine = reader.backend
+    elif reader is not None:
+        engine = reader
+    else:
+        engine = create_backend(ocr_backend, **(backend_options or {}))
+    stop = None
+    if early_exit:
+        stop = EarlyExit(ScreenshotClassifier(LocationMatcher(load_location_map(location_py))), min_confidence)
+    settings = ocr_settings_fingerprint(roi_profile, profiles, preprocess, engine.version(),
+                                        stop.fingerprint() if stop else None, near_duplicate_distance)
+    if own_store:
+        store = OcrStore(output_dir) if text_format in ('jsonl', 'both') else None
+
+    saved = []  # stems stored since the last commit()
+
+    def save(stem, results) -> str:
+        path = None
+        if store is not None:
+            store.put(stem, results)
+            path = store.path
+        if text_format in ('txt', 'both'):
+            path = os.path.join(output_dir, f"{stem}.txt")
+            write_text_output(path, results)
+        saved.append(stem)
+        return path
+
+    def commit():
+        """Flush the store, then tell the journal: it must never be ahead of the texts on disk."""
+        if store is not None:
+            store.flush(sync=journal is not None)
+        if journal is not None:
+            for stem in saved:
+                journal.mark('ocr', stem)
+        saved.clear()
+
+    done = 0
+    # cache key -> every image with that content, so duplicates are OCR'd once
+    pending = {}
+    by_path = {}
+    for entry in images:
+        check_cancel(cancel)
+        image_path = entry.path
+        by_path[image_path] = entry
+        if cache is None:
+            if store is not None:
+                already = entry.stem in store
+            else:
+                already = os.path.exists(os.path.join(output_dir, f"{entry.stem}.txt"))
+            if not force and already:
+                metrics.count('ocr_skipped')
+                logging.info(f"Skipping already processed: {image_path}")
+                done += 1
+                if progress:
+                    progress(done, total)
+                continue
+            pending[image_path] = [image_path]
             continue
         try:
-            results = reader.readtext(image_path)
-            lines = [text for _, text, _ in results]
-            with open(txt_path, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(lines))
-            print(f"Saved text from {image_path} to {txt_path}")
-            logging.info(f"Saved text from {image_path} to {txt_path}")
+            key = OcrCache.make_key(cache.image_hash(entry), settings)
+            cached = None if force else cache.get(key)
         except Exception as e:
-            logging.error(f"OCR failed for {image_path}: {e}")
-            print(f"[!] OCR failed for {image_path}: {e}")
+            logging.error(f"Failed to hash {image_path}: {e}")
+            key, cached = image_path, None
+        if cached is not None:
+            save(entry.stem, cached)
+            if len(saved) >= 256:
+                commit()
+            metrics.count('ocr_cache_hits')
+            logging.info(f"Cache hit, skipping OCR: {image_path}")
+            done += 1
+            if progress:
+                progress(done, total)
+            continue
+        pending.setdefault(key, []).append(image_path)
+    commit()
+    # near-identical frames: the first of each cluster is OCR'd, the rest reuse its text
+    keys = list(pending)
+    hashes = []
+    if near_duplicate_distance >= 0 and len(keys) > 1:
+        variant = hashlib.sha256(json.dumps(
+            {name: {r: list(rect) for r, rect in regions.items()} for name, regions in profiles.items()},
+            sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        for key in keys:
+            check_cancel(cancel)
+            image_path = pending[key][0]
+            entry = by_path[image_path]
+            try:
+                with metrics.timed('phash', image_path):
+                    hashes.append(cache.perceptual_hash(entry, profiles, variant) if cache is not None
+                                  else perceptual_hash(image_path, profiles))
+            except Exception as e:
+                logging.error(f"Failed to hash {image_path}: {e}")
+                hashes.append(None)
+    leaders = cluster_near_duplicates(hashes, near_duplicate_distance) if hashes else list(range(len(keys)))
+    clusters = {}
+    for key, leader in zip(keys, leaders):
+        clusters.setdefault(keys[leader], []).append(key)
+        if keys[leader] != key:
+            logging.info(f"Near-duplicate of {pending[keys[leader]][0]}, reusing its text: {pending[key][0]}")
+    representatives = {pending[key][0]: key for key in clusters}
+    try:
+        for image_path, results, error, timings in iter_ocr_results(
+                list(representatives), workers, roi_profile, profiles,
+                reader if reader is not None or workers > 1 else engine,
+                preprocess, ocr_backend, backend_options, stop, MemoryGuard(max_memory)):
+            check_cancel(cancel)
+            for stage, seconds in timings.items():
+                metrics.observe(stage, seconds, image_path)
+            metrics.count('ocr_failed' if error else 'ocr_done')
+            members = clusters[representatives[image_path]]
+            metrics.count('ocr_duplicates', len(pending[members[0]]) - 1)
+            metrics.count('ocr_near_duplicates', sum(len(pending[key]) for key in members[1:]))
+            same_paths = []
+            for key in members:
+                if cache is not None and error is None and key != pending[key][0]:
+                    cache.put(key, results)
+                same_paths.extend(pending[key])
+            for same_path in same_paths:
+                image_name = by_path[same_path].stem
+                try:
+                    if error:
+                        raise error
+                    saved_to = save(image_name, results)
+                    print(f"Saved text from {same_path} to {saved_to}")
+                    logging.info(f"Saved text from {same_path} to {saved_to}")
+                except Exception as e:
+                    logging.error(f"OCR failed for {same_path}: {e}")
+                    print(f"[!] OCR failed for {same_path}: {e}")
+                done += 1
+                if progress:
+                    progress(done, total)
+            if cache is not None:
+                cache.conn.commit()
+            commit()
+    finally:
+        if store is not None and own_store:
+            store.close()
+        if cache is not None and own_cache:
+            cache.close()
 
-# === MAIN SORTING LOGIC ===
-def process_files(text_folder, image_folder, output_root, location_py_path):
-    reanimation_location_map = load_location_map(location_py_path)
-    for txt_file in os.listdir(text_folder):
-        if not txt_file.lower().endswith(".txt"):
+# === SORTING PIPELINE STAGES ===
+_worker_classifier = None
+
+def _init_classifier_worker(location_map: dict, log_queue):
+    global _worker_classifier
+    log_to_queue(log_queue)
+    _worker_classifier = ScreenshotClassifier(LocationMatcher(location_map))
+
+def _classify_worker_task(batch):
+    """Returns (stem, classification, seconds) per text."""
+    out = []
+    for stem, content, confidences in batch:
+        start = time.perf_counter()
+        result = _worker_classifier.classify(content, confidences)
+        out.append((stem, result, time.perf_counter() - start))
+    return out
+
+def iter_texts(text_folder: str, stems, store: Optional[OcrStore] = None):
+    """Yield (stem, content, confidences) from the OCR store, in file order, then from .txt files
+    for the stems it doesn't have."""
+    stored = [stem for stem in stems if store is not None and stem in store]
+    if stored:
+        stored.sort(key=lambda stem: store.index[stem][0])
+        for stem, lines in store.iter_records(stored):
+            yield stem, '\n'.join(line['text'] for line in lines), [line['conf'] for line in lines]
+    for stem in stems:
+        if store is not None and stem in store:
             continue
-        txt_path = os.path.join(text_folder, txt_file)
+        txt_path = os.path.join(text_folder, f"{stem}.txt")
         try:
             with open(txt_path, "r", encoding="utf-8") as f:
                 content = f.read()
         except Exception as e:
             logging.error(f"Failed to read {txt_path}: {e}")
             continue
-        action_type, person_id = detect_action(content)
-        dt_full, time_of_day = extract_datetime(content)
-        if not action_type or not dt_full:
-            # Place in 'various' if action or date is missing
-            base_name = os.path.splitext(txt_file)[0]
-            image_path = find_image(base_name, image_folder)
-            if image_path:
-                various_path = os.path.join(output_root, 'various')
-                os.makedirs(various_path, exist_ok=True)
-                new_name = f"Various - {base_name}{os.path.splitext(image_path)[1]}"
+        yield stem, content, read_confidences(txt_path)
+
+def iter_text_batches(text_folder: str, stems, batch_size: int = 1, store: Optional[OcrStore] = None):
+    """Reader stage: yield batches of (stem, content, confidences)."""
+    batch = []
+    for item in iter_texts(text_folder, stems, store):
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def feed_queue(items, out_queue):
+    """Run a stage in a thread: put every item on out_queue, then None."""
+    try:
+        for item in items:
+            out_queue.put(item)
+    finally:
+        out_queue.put(None)
+
+def iter_queue(q):
+    while True:
+        item = q.get()
+        if item is None:
+            return
+        yield item
+
+def bounded_map(submit, items, max_in_flight: int):
+    """Yield submit(item).result() in input order with at most max_in_flight futures pending."""
+    from collections import deque
+    pending = deque()
+    for item in items:
+        pending.append(submit(item))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def plan_placement(base_name: str, result: Classification, images: ImageIndex, output_root: str,
+                   min_confidence: float = 0):
+    """Decide where the screenshot base_name goes. Returns (image_path, output_path, new_name, kind) or None.
+
+    Results read with a confidence below min_confidence go to 'review' under their guessed name.
+    """
+    action_type, person_id = result.action, result.name
+    dt_full, time_of_day = result.datetime, result.time_of_day
+    if not action_type or not dt_full:
+        # Place in 'various' if action or date is missing
+        image_path = images.find(base_name)
+        if image_path:
+            various_path = os.path.join(output_root, 'various')
+            new_name = f"Various - {base_name}{os.path.splitext(image_path)[1]}"
+            return image_path, various_path, new_name, 'various'
+        print(f"[ ] Пропущено (нет действия или даты): {base_name}")
+        logging.warning(f"[ ] Skipped (no action or date): {base_name}")
+        return None
+    # === Определяем путь сохранения ===
+    if action_type == "reanimation":
+        city_flag = result.location_folder
+        if not city_flag:
+            print(f"[!] Локация не найдена для реанимации: {base_name}")
+            logging.warning(f"[!] Location is not found for reanimation: {base_name}")
+            return None
+        output_path = os.path.join(output_root, action_type, city_flag, time_of_day)
+    else:
+        simple_loc = result.location_folder
+        if not simple_loc:
+            print(f"[!] Локация не найдена для {action_type}: {base_name}")
+            logging.warning(f"[!] Location is not found for {action_type}: {base_name}")
+            return None
+        output_path = os.path.join(output_root, action_type, simple_loc)
+    # === Ищем изображение ===
+    image_path = images.find(base_name)
+    if not image_path:
+        print(f"[!] Изображение не найдено: {base_name}")
+        logging.warning(f"[!] Image is not found: {base_name}")
+        return None
+    safe_date = safe_filename(dt_full)
+    new_name = f"{action_type.capitalize()} - {safe_date}"
+    if person_id:
+        new_name += f" - {person_id}"
+    new_name += os.path.splitext(image_path)[1]
+    if result.confidence is not None and result.confidence < min_confidence:
+        logging.info(f"[?] Low OCR confidence ({result.confidence:.2f}), sent to review: {base_name}")
+        return image_path, os.path.join(output_root, 'review'), new_name, 'review'
+    return image_path, output_path, new_name, action_type
+
+# === ВЫВОД: КОПИЯ / ССЫЛКИ ===
+LINK_MODES = ['copy', 'hardlink', 'reflink', 'symlink', 'move']
+MANIFEST_NAME = 'manifest.jsonl'
+
+def _reflink(src: str, dst: str):
+    import fcntl  # Linux only; other platforms fall back to a copy
+    FICLONE = 0x40049409
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.remove(dst)
+            raise
+
+def copy_atomic(src: str, dst: str):
+    """Copy a file or archive member; dst appears complete or not at all. Replacing dst also
+    replaces an old symlink there instead of writing through it into its source. Not fsync'd:
+    that would cost a round trip per screenshot on a network share."""
+    with open_input(src) as f_src, atomic_open(dst, 'wb', sync=False) as f_dst:
+        shutil.copyfileobj(f_src, f_dst, 1 << 20)
+    if archive_member(src)[1] is None:
+        shutil.copymode(src, dst)
+
+def link_or_copy(src: str, dst: str, mode: str = 'copy') -> str:
+    """Place src at dst using mode, falling back to a copy when the link is impossible
+    (another filesystem, no privilege, unsupported). Returns the mode actually used.
+    Archive members can only be copied out."""
+    if archive_member(src)[1] is not None:
+        copy_atomic(src, dst)
+        return 'copy'
+    if mode == 'move':
+        try:
+            os.replace(src, dst)  # also over place_file's placeholder, on Windows too
+        except OSError:
+            shutil.move(src, dst)  # another drive: copy + delete
+        return mode
+    if mode != 'copy' and os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        if mode == 'hardlink':
+            os.link(src, dst)
+            return mode
+        if mode == 'symlink':
+            os.symlink(os.path.abspath(src), dst)
+            return mode
+        if mode == 'reflink':
+            _reflink(src, dst)
+            return mode
+    except (OSError, ImportError) as e:
+        logging.info(f"{mode} failed for {src} ({e}), copying instead")
+    copy_atomic(src, dst)
+    return 'copy'
+
+# Bump when the classification logic changes in a way the settings below don't capture
+RULES_VERSION = 1
+
+def rules_fingerprint(location_map: dict, min_confidence: float = 0, dedupe: bool = False) -> str:
+    """Hash of everything that decides a classification besides the OCR text."""
+    rules = {
+        'dedupe': dedupe,
+        'min_confidence': min_confidence,
+        'version': RULES_VERSION,
+        'reanimation_locations': location_map,
+        'simple_locations': LOCATION_MAP,
+        'actions': [(action, phrase, pattern.pattern) for action, phrase, pattern in ACTION_PATTERNS],
+        'action_threshold': ACTION_THRESHOLD,
+        'location_threshold': LOCATION_THRESHOLD,
+        'datetime': DATETIME_PATTERN.pattern,
+    }
+    return hashlib.sha256(json.dumps(rules, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+class SortManifest:
+    """Last sort result per screenshot stem, kept in output_root/manifest.jsonl.
+
+    Each record holds the text and image stats, the image hash, the rules fingerprint, the
+    classification and the destination. process_files loads it, skips inputs that are still
+    current and rewrites the file atomically at the end. count-points.py uses the image hashes
+    to tell hand-filed copies of sorted screenshots.
+    """
+
+    def __init__(self, output_root: str, rules: str):
+        self.output_root = output_root
+        self.path = os.path.join(output_root, MANIFEST_NAME)
+        self.rules = rules
+        self.records = {}
+        self.dest_owners = {}
+        self.changed = set()
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        stem = record['stem']
+                    except (ValueError, KeyError):
+                        continue  # entries written before the manifest was keyed by stem
+                    self._set(stem, record)
+        self.changed = set()  # stems to write on the next save(compact=False)
+
+    def _set(self, stem: str, record: dict):
+        old = self.records.get(stem)
+        if old and old.get('dest'):
+            self.dest_owners.get(old['dest'], set()).discard(stem)
+        self.records[stem] = record
+        if record.get('dest'):
+            self.dest_owners.setdefault(record['dest'], set()).add(stem)
+        self.changed.add(stem)
+
+    def dest_path(self, dest: str) -> str:
+        return os.path.join(self.output_root, *dest.split('/'))
+
+    def is_current(self, stem: str, text_stat: tuple, image: Optional[ImageEntry]) -> bool:
+        record = self.records.get(stem)
+        if not record or record.get('rules') != self.rules:
+            return False
+        if (record.get('text_size'), record.get('text_mtime_ns')) != tuple(text_stat):
+            return False
+        dest = record.get('dest')
+        if dest and not os.path.lexists(self.dest_path(dest)):
+            return False
+        if image is None:
+            # moved away by --link-mode move, or still missing
+            return record.get('mode') == 'move' or record.get('image_hash') is None
+        if record.get('image_hash') is None:
+            return False
+        if (record.get('image_size'), record.get('image_mtime_ns')) != (image.size, image.mtime_ns):
+            try:
+                if file_sha256(image.path) != record['image_hash']:
+                    return False
+            except OSError:
+                return False
+            record['image_size'], record['image_mtime_ns'] = image.size, image.mtime_ns
+            self.changed.add(stem)
+        return True
+
+    def moved_image(self, stem: str) -> Optional[ImageEntry]:
+        """The sorted copy of a screenshot that --link-mode move took out of the input folder."""
+        record = self.records.get(stem)
+        if not record or record.get('mode') != 'move' or not record.get('dest'):
+            return None
+        path = self.dest_path(record['dest'])
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return ImageEntry(stem, path, st.st_size, st.st_mtime_ns)
+
+    def update(self, stem: str, text_stat: tuple, image: Optional[ImageEntry],
+               result: Classification, placed: Optional[dict]) -> Optional[dict]:
+        """Record the new result for stem and return the previous record."""
+        old = self.records.get(stem)
+        image_hash = None
+        if image is not None:
+            path = image.path
+            if not os.path.exists(path) and placed:
+                path = self.dest_path(placed['dest'])  # moved
+            try:
+                image_hash = file_sha256(path)
+            except OSError:
+                pass
+        record = {
+            'stem': stem,
+            'source': os.path.abspath(image.path) if image else None,
+            'image_size': image.size if image else None,
+            'image_mtime_ns': image.mtime_ns if image else None,
+            'image_hash': image_hash,
+            'text_size': text_stat[0],
+            'text_mtime_ns': text_stat[1],
+            'rules': self.rules,
+            'classification': asdict(result),
+            'dest': placed['dest'] if placed else None,
+            'kind': placed['kind'] if placed else None,
+            'mode': placed['mode'] if placed else None,
+            'time': time.time(),
+        }
+        self._set(stem, record)
+        return old
+
+    def is_claimed(self, dest: str) -> bool:
+        return bool(self.dest_owners.get(dest))
+
+    def save(self, compact: bool = True):
+        """Rewrite the file atomically; compact=False appends only the changed records (the last
+        record of a stem wins on load), so a watch batch doesn't rewrite the whole manifest."""
+        os.makedirs(self.output_root, exist_ok=True)
+        if not compact and os.path.exists(self.path):
+            if self.changed:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    for stem in sorted(self.changed):
+                        f.write(json.dumps(self.records[stem], ensure_ascii=False) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+        else:
+            with atomic_open(self.path) as f:
+                for record in self.records.values():
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.changed = set()
+
+def write_sorted_archive(output_root: str, archive_path: str) -> int:
+    """Pack the sorted screenshots (the manifest destinations) and the manifest into a .zip or
+    .tar with the output folder layout. Returns the number of screenshots packed."""
+    manifest = SortManifest(output_root, '')
+    dests = sorted({record['dest'] for record in manifest.records.values() if record.get('dest')})
+    files = [(manifest.dest_path(dest), dest) for dest in dests if os.path.exists(manifest.dest_path(dest))]
+    files.append((manifest.path, MANIFEST_NAME))
+    with atomic_open(archive_path, 'wb') as f:
+        if archive_path.lower().endswith('.zip'):
+            # screenshots are compressed already
+            with zipfile.ZipFile(f, 'w', zipfile.ZIP_STORED) as zf:
+                for path, name in files:
+                    zf.write(path, name)
+        else:
+            with tarfile.open(fileobj=f, mode='w') as tf:
+                for path, name in files:
+                    tf.add(os.path.realpath(path), arcname=name)  # symlink/hardlink modes: pack the content
+    return len(files) - 1
+
+def place_file(image_path: str, output_path: str, new_name: str, kind: str,
+               link_mode: str = 'copy', output_root: str = '.'):
+    """I/O stage: put one screenshot into its output folder.
+
+    Returns (console line, manifest record or None); the caller prints and records them
+    so parallel placements don't interleave their output.
+    """
+    claimed = None
+    try:
+        os.makedirs(output_path, exist_ok=True)
+        dest = os.path.join(output_path, new_name)
+        stem, ext = os.path.splitext(new_name)
+        if link_mode == 'move' and is_own_move(image_path, output_path, new_name):
+            # re-sorted into the folder it already sits in: keep it, don't rename it to "(2)"
+            dest = image_path
+            used_mode = 'move'
+        elif link_mode == 'move':
+            # a moved screenshot has no other copy, never overwrite one with the same name;
+            # the name is claimed with an empty placeholder, so parallel placements can't pick it too
+            n = 2
+            while True:
                 try:
-                    shutil.copy(image_path, os.path.join(various_path, new_name))
-                    print(f"[~] No action/date: {new_name} → {various_path}")
-                    logging.info(f"[~] No action/date: {new_name} -> {various_path}")
-                except Exception as e:
-                    logging.error(f"Failed to copy {image_path} to {various_path}: {e}")
-                    print(f"[!] Failed to copy {image_path} to {various_path}: {e}")
-            else:
-                print(f"[ ] Пропущено (нет действия или даты): {txt_file}")
-                logging.warning(f"[ ] Skipped (no action or date): {txt_file}")
+                    os.close(os.open(dest, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                    claimed = dest
+                    break
+                except FileExistsError:
+                    dest = os.path.join(output_path, f"{stem} ({n}){ext}")
+                    n += 1
+            used_mode = link_or_copy(image_path, dest, link_mode)
+        else:
+            used_mode = link_or_copy(image_path, dest, link_mode)
+        record = {
+            'source': os.path.abspath(image_path),
+            'dest': os.path.relpath(dest, output_root).replace(os.sep, '/'),
+            'kind': kind,
+            'mode': used_mode,
+            'time': time.time(),
+        }
+        if kind == 'various':
+            logging.info(f"[~] No action/date: {new_name} -> {output_path}")
+            return f"[~] No action/date: {new_name} → {output_path}", record
+        logging.info(f"[+] {kind.capitalize()} -> {new_name} -> {output_path}")
+        return f"[✔] {kind.capitalize()} → {new_name} → {output_path}", record
+    except Exception as e:
+        if claimed is not None:
+            try:
+                if os.path.getsize(claimed) == 0:
+                    os.remove(claimed)  # the placeholder, the move didn't happen
+            except OSError:
+                pass
+        logging.error(f"Failed to place {image_path} in {output_path}: {e}")
+        return f"[!] Failed to copy {image_path} to {output_path}: {e}", None
+
+def return_moved(path: str, source: Optional[str], image_folder: str) -> str:
+    """Put a screenshot that --link-mode move sorted back where it came from (or into image_folder),
+    never over an existing file. Returns its new path."""
+    if source and os.path.isdir(os.path.dirname(source)):
+        target = source
+    else:
+        target = os.path.join(image_folder, os.path.basename(source or path))
+    stem, ext = os.path.splitext(target)
+    n = 2
+    while os.path.lexists(target):
+        target = f"{stem} ({n}){ext}"
+        n += 1
+    shutil.move(path, target)
+    return target
+
+def is_own_move(image_path: str, output_path: str, new_name: str) -> bool:
+    """image_path is a screenshot --link-mode move already put in output_path as new_name or
+    one of its "name (n)" variants."""
+    if archive_member(image_path)[1] is not None:
+        return False
+    if os.path.normcase(os.path.abspath(os.path.dirname(image_path))) != os.path.normcase(os.path.abspath(output_path)):
+        return False
+    stem, ext = os.path.splitext(new_name)
+    return re.fullmatch(re.escape(stem) + r'( \(\d+\))?' + re.escape(ext), os.path.basename(image_path)) is not None
+
+# === MAIN SORTING LOGIC ===
+def process_files(text_folder, image_folder, output_root, location_py_path, jobs: int = 1,
+                  link_mode: str = 'copy', progress=None, images: Optional[ImageIndex] = None,
+                  force: bool = False, stems: Optional[set] = None,
+                  min_confidence: float = DEFAULT_MIN_CONFIDENCE, text_format: str = 'jsonl',
+                  metrics: Optional[RunMetrics] = None, cancel=None, dedupe: bool = True,
+                  journal: Optional['RunJournal'] = None, resumed: Optional[dict] = None,
+                  store: Optional['OcrStore'] = None, manifest: Optional['SortManifest'] = None,
+                  classifier: Optional['ScreenshotClassifier'] = None):
+    """Read -> classify -> place. With jobs > 1 classification runs in a process pool and
+    placement in a thread pool, with bounded queues between the stages.
+
+    Only texts/images that changed since the last run (per the sort manifest), or every
+    input after a change of the location list or matching rules, are processed.
+    stems restricts the run to those screenshots (used by the watch mode).
+    Classifications read below min_confidence are placed in output_root/review.
+    Texts are streamed from text_folder/ocr.jsonl, falling back to <stem>.txt files for screenshots
+    it doesn't have; text_format 'txt' reads only the .txt files.
+    Setting cancel (a threading.Event) raises Cancelled between files; finished placements are kept.
+    With dedupe, a screenshot of an event (action, name, timestamp) that another one already
+    counts for goes to output_root/duplicates instead.
+    Every recorded placement is marked in journal; resumed (stem -> manifest record, from an
+    interrupted run's journal) restores those records and skips the stems, even with force.
+    Watch mode keeps the store, manifest and classifier open between batches and passes them in:
+    the manifest then only appends its changes, and classification runs in this process.
+    """
+    import queue
+    own_manifest = manifest is None
+    location_map = load_location_map(location_py_path) if own_manifest or classifier is None else None
+    images = images if images is not None else ImageIndex(image_folder)
+    if own_manifest:
+        manifest = SortManifest(output_root, rules_fingerprint(location_map, min_confidence, dedupe))
+    if store is None and text_format != 'txt':
+        store = OcrStore(text_folder)
+    # stem -> version of its text: (size, mtime_ns) of a .txt file or (length, crc32) of a store record
+    text_stats = {}
+    with os.scandir(text_folder) as it:
+        for entry in it:
+            if not entry.name.lower().endswith(".txt"):
+                continue
+            stem = os.path.splitext(entry.name)[0]
+            if stems is not None and stem not in stems:
+                continue
+            if entry.is_file():
+                st = entry.stat()
+                text_stats[stem] = (st.st_size, st.st_mtime_ns)
+    if store is not None:
+        for stem, version in store.versions.items():
+            if stems is None or stem in stems:
+                text_stats[stem] = version
+    total = len(text_stats)
+    skipped = 0
+    for stem, record in (resumed or {}).items():
+        if record and stem in text_stats:
+            manifest._set(stem, record)
+            skipped += 1
+    todo = []
+    for stem in sorted(text_stats):
+        if resumed and resumed.get(stem):
+            continue
+        if not force and manifest.is_current(stem, text_stats[stem], images.entries.get(stem)):
             continue
-        # === Определяем путь сохранения ===
-        output_path = None
-        if action_type == "reanimation":
-            loc_name, city_flag = detect_reanimation_location(content, reanimation_location_map)
-            if not loc_name:
-                print(f"[!] Локация не найдена для реанимации: {txt_file}")
-                logging.warning(f"[!] Location is not found for reanimation: {txt_file}")
+        if stem not in images.entries:
+            moved = manifest.moved_image(stem)
+            if moved:
+                images.entries[stem] = moved
+        todo.append(stem)
+    done = total - len(todo)
+    # (action, name, timestamp) -> earlier sorted stems of it, per the manifest; their outputs are
+    # only checked once this run sees the same event again, not statted for every record
+    events = {}
+    owners = {}  # (action, name, timestamp) -> stem whose screenshot is sorted for it
+    if dedupe:
+        pending = set(todo)
+        for stem in sorted(manifest.records):
+            record = manifest.records[stem]
+            c = record.get('classification') or {}
+            if stem in pending or record.get('kind') != c.get('action') or not c.get('name') or not record.get('dest'):
                 continue
-            output_path = os.path.join(output_root, action_type, city_flag, time_of_day)
+            events.setdefault((c['action'], c['name'].lower(), c['datetime']), []).append(stem)
+    metrics = metrics if metrics is not None else RunMetrics()
+    if resumed is not None:
+        metrics.count('resumed_sort_skipped', skipped)
+    metrics.count('sort_up_to_date', done - skipped)
+    if done:
+        print(f"[=] Up to date, skipped: {done}")
+        logging.info(f"Up to date, skipped: {done}")
+    if progress:
+        progress(done, total)
+
+    def dedupe_placement(stem, result, placement):
+        """Send a repeat screenshot of an already sorted event to 'duplicates'."""
+        if not dedupe or placement is None or placement[3] != result.action or not result.name:
+            return placement
+        key = (result.action, result.name.lower(), result.datetime)
+        owner = owners.get(key)
+        if owner is None:
+            owner = next((earlier for earlier in events.get(key, ())
+                          if os.path.lexists(manifest.dest_path(manifest.records[earlier]['dest']))), stem)
+            owners[key] = owner
+        if owner == stem:
+            return placement
+        image_path, _, new_name, _ = placement
+        name, ext = os.path.splitext(new_name)
+        logging.info(f"[=] Same event as {owner}, sent to duplicates: {stem}")
+        return image_path, os.path.join(output_root, 'duplicates'), f"{name} - {stem}{ext}", 'duplicate'
+
+    def finish(stem, result, placement, message=None, placed=None):
+        nonlocal done
+        if message:
+            print(message)
+        if placement is None:
+            metrics.count('sort_unplaced')
+        elif placed is None:
+            metrics.count('sort_failed')
         else:
-            simple_loc = detect_simple_location(content)
-            if not simple_loc:
-                print(f"[!] Локация не найдена для {action_type}: {txt_file}")
-                logging.warning(f"[!] Location is not found for {action_type}: {txt_file}")
+            metrics.count(f"sorted_{placed['kind']}")
+        if not (placement and placed is None):  # failed placements are retried next run
+            old = manifest.update(stem, text_stats[stem], images.entries.get(stem), result, placed)
+            if journal is not None:
+                journal.mark('sort', stem, manifest.records[stem])
+            stale = old.get('dest') if old else None
+            if stale and stale != (placed or {}).get('dest') and not manifest.is_claimed(stale):
+                stale_path = manifest.dest_path(stale)
+                try:
+                    if not os.path.lexists(stale_path):
+                        pass
+                    elif old.get('mode') == 'move':
+                        # the only copy of the screenshot: hand it back instead of deleting it
+                        restored = return_moved(stale_path, old.get('source'), image_folder)
+                        print(f"[<] No longer sorted, moved back: {restored}")
+                        logging.info(f"[<] No longer sorted, moved back to the input: {stale_path} -> {restored}")
+                    else:
+                        os.remove(stale_path)
+                        logging.info(f"[-] Removed stale output: {stale_path}")
+                except OSError as e:
+                    logging.error(f"Failed to remove stale output {stale_path}: {e}")
+        done += 1
+        if progress:
+            progress(done, total)
+
+    try:
+        if jobs <= 1 or classifier is not None:
+            classifier = classifier if classifier is not None else ScreenshotClassifier(LocationMatcher(location_map))
+            for batch in iter_text_batches(text_folder, todo, store=store):
+                for stem, content, confidences in batch:
+                    check_cancel(cancel)
+                    with metrics.timed('classify', stem):
+                        result = classifier.classify(content, confidences)
+                    with metrics.timed('find_image', stem):
+                        placement = dedupe_placement(
+                            stem, result, plan_placement(stem, result, images, output_root, min_confidence))
+                    if placement:
+                        with metrics.timed('copy', stem):
+                            outcome = place_file(*placement, link_mode, output_root)
+                        finish(stem, result, placement, *outcome)
+                    else:
+                        finish(stem, result, None)
+            return
+
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        batch_size = 64
+        texts = queue.Queue(maxsize=jobs * 4)
+        reader = threading.Thread(target=feed_queue, daemon=True,
+                                  args=(iter_text_batches(text_folder, todo, batch_size, store), texts))
+        reader.start()
+        io_threads = min(32, jobs * 4)
+        with ProcessPoolExecutor(jobs, initializer=_init_classifier_worker,
+                                 initargs=(location_map, worker_log_queue())) as classifiers, \
+                ThreadPoolExecutor(io_threads) as placers:
+            def placements():
+                classified = bounded_map(lambda batch: classifiers.submit(_classify_worker_task, batch),
+                                         iter_queue(texts), jobs * 2)
+                for batch in classified:
+                    check_cancel(cancel)
+                    for stem, result, seconds in batch:
+                        metrics.observe('classify', seconds, stem)
+                        with metrics.timed('find_image', stem):
+                            placement = dedupe_placement(
+                                stem, result, plan_placement(stem, result, images, output_root, min_confidence))
+                        if placement:
+                            yield stem, result, placement
+                        else:
+                            finish(stem, result, None)
+
+            def place(item):
+                stem, result, placement = item
+                with metrics.timed('copy', stem):
+                    return stem, result, placement, *place_file(*placement, link_mode, output_root)
+
+            for outcome in bounded_map(lambda item: placers.submit(place, item), placements(), io_threads * 4):
+                finish(*outcome)
+        reader.join()
+    finally:
+        manifest.save(compact=own_manifest)
+
+# === ЖУРНАЛ ЗАПУСКА ===
+JOURNAL_PATH = 'run-journal.jsonl'
+
+class RunJournal:
+    """Progress of one run_pipeline() call, appended as it happens, one JSON object per line:
+
+        {"run": {PipelineOptions}, "started": ...}
+        {"stem": ..., "stage": "ocr"}                   its text is stored (and on disk)
+        {"stem": ..., "stage": "sort", "record": {...}}  placed, with its manifest record
+        {"finished": ...}
+
+    A run that is killed, crashes or is stopped has no "finished" line; --resume reads the journal
+    back and skips every stage it records. Lines are flushed at once and fsync'd at most once a
+    second: after a power loss a few finished files may be redone, none are skipped unfinished.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.options = None
+        self.started = None
+        self.finished = False
+        self.done = {'ocr': set(), 'sort': {}}
+        self.handle = None
+        self.synced = 0.0
+        self.torn = False
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                self.torn = not line.endswith('\n')
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue  # torn line of a killed run
+                if 'run' in event:
+                    self.options, self.started, self.finished = event['run'], event.get('started'), False
+                    self.done = {'ocr': set(), 'sort': {}}
+                elif 'finished' in event:
+                    self.finished = True
+                elif event.get('stage') == 'ocr':
+                    self.done['ocr'].add(event['stem'])
+                elif event.get('stage') == 'sort':
+                    self.done['sort'][event['stem']] = event.get('record')
+
+    @property
+    def interrupted(self) -> bool:
+        return self.options is not None and not self.finished
+
+    def start(self, options: dict, resume: bool = False):
+        """Begin a run; resume appends to the interrupted run's journal instead of starting over."""
+        if resume and self.interrupted:
+            self.handle = open(self.path, 'a', encoding='utf-8')
+            if self.torn:
+                self.handle.write('\n')  # end the torn line, so the next event parses
+            return
+        self.options, self.finished, self.done = options, False, {'ocr': set(), 'sort': {}}
+        self.started = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.handle = open(self.path, 'w', encoding='utf-8')
+        self._append({'run': options, 'started': self.started}, sync=True)
+
+    def _append(self, event: dict, sync: bool = False):
+        self.handle.write(json.dumps(event, ensure_ascii=False) + '\n')
+        self.handle.flush()
+        if sync or time.monotonic() - self.synced >= 1.0:
+            os.fsync(self.handle.fileno())
+            self.synced = time.monotonic()
+
+    def mark(self, stage: str, stem: str, record: Optional[dict] = None):
+        if self.handle is None:
+            return
+        event = {'stem': stem, 'stage': stage}
+        if record is not None:
+            event['record'] = record
+        self._append(event)
+
+    def finish(self):
+        if self.handle is not None:
+            self._append({'finished': time.strftime('%Y-%m-%dT%H:%M:%S')}, sync=True)
+            self.finished = True
+
+    def close(self):
+        if self.handle is not None:
+            os.fsync(self.handle.fileno())
+            self.handle.close()
+            self.handle = None
+
+# === PIPELINE ===
+@dataclass
+class PipelineOptions:
+    """Everything one OCR + sort run needs; the CLI fills it from argparse, the GUI from its widgets."""
+    input_dir: str = 'images'
+    output_texts: str = 'output_texts'
+    output_images: str = 'output_images'
+    location_py: str = 'gta-locations.py'
+    skip_ocr: bool = False
+    force_ocr: bool = False
+    force_sort: bool = False
+    workers: int = 1
+    jobs: int = 1
+    link_mode: str = 'copy'
+    text_format: str = 'jsonl'
+    min_confidence: float = DEFAULT_MIN_CONFIDENCE
+    dedupe: bool = True
+    ocr: dict = field(default_factory=dict)  # further ocr_images() options: ROI, cache, backend, preprocessing
+    run_summary: Optional[str] = 'run-summary.json'
+    prometheus_textfile: Optional[str] = None
+    output_archive: Optional[str] = None  # also pack the sorted output into this .zip/.tar
+    journal: Optional[str] = JOURNAL_PATH  # run journal for resume, None/'' to skip
+
+    def ocr_options(self) -> dict:
+        return dict(self.ocr, text_format=self.text_format, min_confidence=self.min_confidence,
+                    location_py=self.location_py)
+
+    def sort_options(self) -> dict:
+        return dict(jobs=self.jobs, link_mode=self.link_mode, min_confidence=self.min_confidence,
+                    text_format=self.text_format, dedupe=self.dedupe)
+
+def run_pipeline(options: PipelineOptions, progress=None, cancel=None, reader=None,
+                 metrics: Optional[RunMetrics] = None, resume: bool = False) -> RunMetrics:
+    """OCR the input folder (or .zip/.tar), then classify and sort it. Shared by the CLI and the GUI.
+
+    progress(stage, done, total) is called with stage 'ocr' or 'sort'. Setting cancel (a
+    threading.Event) stops between files with Cancelled; the run summary is written either way.
+    Progress goes to the run journal; resume continues an interrupted run with its options,
+    skipping the OCR and placements it finished (even under force_ocr/force_sort).
+    """
+    metrics = metrics if metrics is not None else RunMetrics()
+    journal = RunJournal(options.journal) if options.journal else None
+    if resume and (journal is None or not journal.interrupted):
+        print("[=] No interrupted run to resume, starting a new one")
+        logging.info("No interrupted run to resume, starting a new one")
+        resume = False
+    if resume:
+        fields = PipelineOptions.__dataclass_fields__
+        options = PipelineOptions(**{k: v for k, v in journal.options.items() if k in fields})
+        print(f"[=] Resuming the run started {journal.started}: {len(journal.done['ocr'])} OCR'd, "
+              f"{len(journal.done['sort'])} sorted")
+        logging.info(f"Resuming the run started {journal.started}")
+    images = ImageIndex(options.input_dir)
+    if journal is not None:
+        journal.start(asdict(options), resume)
+    try:
+        if not options.skip_ocr:
+            ocr_index = images
+            if resume:
+                ocr_index = ImageIndex.from_entries(options.input_dir,
+                                                    [e for e in images if e.stem not in journal.done['ocr']])
+                metrics.count('resumed_ocr_skipped', len(images) - len(ocr_index))
+            ocr_images(options.input_dir, options.output_texts, force=options.force_ocr, workers=options.workers,
+                       images=ocr_index, reader=reader, metrics=metrics, cancel=cancel, journal=journal,
+                       progress=(lambda done, total: progress('ocr', done, total)) if progress else None,
+                       **options.ocr_options())
+        process_files(options.output_texts, options.input_dir, options.output_images, options.location_py,
+                      images=images, force=options.force_sort, metrics=metrics, cancel=cancel, journal=journal,
+                      resumed=journal.done['sort'] if resume else None,
+                      progress=(lambda done, total: progress('sort', done, total)) if progress else None,
+                      **options.sort_options())
+        if options.output_archive:
+            packed = write_sorted_archive(options.output_images, options.output_archive)
+            metrics.count('archived', packed)
+            print(f"[=] Packed {packed} sorted screenshots into {options.output_archive}")
+            logging.info(f"Packed {packed} sorted screenshots into {options.output_archive}")
+        if journal is not None:
+            journal.finish()
+    except Cancelled:
+        metrics.count('cancelled')
+        logging.info("Run cancelled")
+        raise
+    finally:
+        if journal is not None:
+            journal.close()
+        metrics.write_reports(options.run_summary, options.prometheus_textfile)
+    return metrics
+
+# === OCR SERVICE ===
+# --serve: a local HTTP endpoint for clients without their own model (the GUI's "OCR server", the
+# remote backend). Requests from many connections are collected into micro-batches, so the backend
+# sees one readtext_batch call per batch instead of one per screenshot.
+#   POST /ocr       image bytes -> {"classification": {...}, "lines": [...], "seconds": ...}
+#   POST /readtext  image bytes -> {"lines": [...]}  (no ROI, preprocessing or classification)
+#   GET  /health    -> {"status": "ok", "engine": ..., "queued": ...}
+MAX_UPLOAD_SIZE = 32 * 1024 * 1024
+
+class MicroBatcher:
+    """Queue of decoded images in front of one OCR backend, drained by a single thread.
+
+    A batch is the first waiting request plus whatever arrives within max_wait seconds, up to
+    max_batch. submit() raises queue.Full once max_queue requests are waiting, which the server
+    turns into 503 so clients back off instead of piling up memory.
+    """
+
+    def __init__(self, reader, roi_profile: str = 'auto', profiles: Optional[dict] = None,
+                 preprocess: Optional[dict] = None, max_batch: int = 8, max_wait: float = 0.05,
+                 max_queue: int = 32, metrics: Optional[RunMetrics] = None):
+        import queue
+        self.reader = reader
+        self.roi = (roi_profile, profiles, preprocess)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.metrics = metrics if metrics is not None else RunMetrics()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, image: np.ndarray, raw: bool = False):
+        """Future of the image's (box, text, confidence) lines; raw skips ROI cropping and preprocessing."""
+        from concurrent.futures import Future
+        future = Future()
+        self.queue.put_nowait((image, raw, future))
+        return future
+
+    def _run(self):
+        import queue
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.queue.put(None)  # finish this batch, then stop
+                    break
+                batch.append(item)
+            roi_profile, profiles, preprocess = self.roi
+            try:
+                with self.metrics.timed('ocr', f"batch of {len(batch)}"):
+                    prepared = [prepare_crops(image, 'off', profiles) if raw
+                                else prepare_crops(image, roi_profile, profiles, preprocess)
+                                for image, raw, _ in batch]
+                    futures = [future for _, _, future in batch]
+                    batch = None  # free the decoded frames, the crops are copies
+                    results = read_prepared(self.reader, prepared)
+                for future, lines in zip(futures, results):
+                    future.set_result(lines)
+            except Exception as e:
+                futures = futures if batch is None else [future for _, _, future in batch]
+                logging.error(f"OCR batch of {len(futures)} failed: {e}")
+                for future in futures:
+                    future.set_exception(e)
+            self.metrics.count('service_batches')
+            self.metrics.count('service_images', len(futures))
+
+    def close(self):
+        """Fail the requests still waiting, finish the running batch and stop the thread."""
+        import queue
+        while True:
+            try:
+                item = self.queue.get_nowait()
+                if item is not None:
+                    item[2].set_exception(RuntimeError('OCR service stopped'))
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put(None, timeout=0.1)
+                break
+            except queue.Full:
                 continue
-            output_path = os.path.join(output_root, action_type, simple_loc)
-        # === Ищем изображение ===
-        base_name = os.path.splitext(txt_file)[0]
-        image_path = find_image(base_name, image_folder)
-        if not image_path:
-            print(f"[!] Изображение не найдено: {txt_file}")
-            logging.warning(f"[!] Image is not found: {txt_file}")
-            continue
-        # === Сохраняем ===
-        os.makedirs(output_path, exist_ok=True)
-        safe_date = safe_filename(dt_full)
-        new_name = f"{action_type.capitalize()} - {safe_date}"
-        if person_id:
-            new_name += f" - {person_id}"
-        new_name += os.path.splitext(image_path)[1]
+        self.thread.join()
+
+def make_ocr_server(address: str, batcher: MicroBatcher, classifier: 'ScreenshotClassifier',
+                    engine: str, timeout: float = 120):
+    """ThreadingHTTPServer for the endpoints above; address is "host:port"."""
+    import queue
+    from concurrent.futures import TimeoutError as FutureTimeout
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            logging.info(f"{self.address_string()} {format % args}")
+
+        def send_json(self, status: int, payload: dict, headers: Optional[dict] = None):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != '/health':
+                self.send_json(404, {'error': f"unknown path {self.path}"})
+                return
+            self.send_json(200, {'status': 'ok', 'engine': engine, 'queued': batcher.queue.qsize()})
+
+        def do_POST(self):
+            if self.path not in ('/ocr', '/readtext'):
+                self.send_json(404, {'error': f"unknown path {self.path}"})
+                return
+            length = int(self.headers.get('Content-Length') or 0)
+            if not 0 < length <= MAX_UPLOAD_SIZE:
+                self.send_json(413 if length else 411, {'error': f"send the image as a body of 1..{MAX_UPLOAD_SIZE} bytes"})
+                return
+            started = time.perf_counter()
+            try:
+                image = decode_image(io.BytesIO(self.rfile.read(length)))
+            except Exception as e:
+                self.send_json(400, {'error': f"not an image: {e}"})
+                return
+            try:
+                future = batcher.submit(image, raw=self.path == '/readtext')
+                del image  # the batcher holds it until the crops are cut
+            except queue.Full:
+                batcher.metrics.count('service_rejected')
+                self.send_json(503, {'error': 'OCR queue is full, retry later'}, {'Retry-After': '1'})
+                return
+            try:
+                results = future.result(timeout=timeout)
+            except Exception as e:
+                self.send_json(504 if isinstance(e, FutureTimeout) else 500, {'error': str(e) or type(e).__name__})
+                return
+            lines = [{'box': [[float(x), float(y)] for x, y in box], 'text': text, 'conf': float(conf)}
+                     for box, text, conf in results]
+            if self.path == '/readtext':
+                self.send_json(200, {'lines': lines})
+                return
+            result = classifier.classify('\n'.join(text for _, text, _ in results),
+                                         [float(conf) for _, _, conf in results])
+            self.send_json(200, {'classification': asdict(result), 'lines': lines,
+                                 'seconds': round(time.perf_counter() - started, 3)})
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 128  # bursts of connects wait in the backlog; the batcher queue answers 503
+
+    host, _, port = address.rpartition(':')
+    return Server((host or '127.0.0.1', int(port)), Handler)
+
+def serve(address: str, location_py: str, ocr_backend: str = 'easyocr', backend_options: Optional[dict] = None,
+          roi_profile: str = 'auto', roi_config: Optional[str] = None, preprocess: str = DEFAULT_PREPROCESS,
+          preprocess_config: Optional[str] = None, max_batch: int = 8, max_wait: float = 0.05,
+          max_queue: int = 32, metrics: Optional[RunMetrics] = None, report=None):
+    """Run the OCR service until Ctrl+C. report() is called on the way out."""
+    reader = create_backend(ocr_backend, **(backend_options or {})).load()
+    batcher = MicroBatcher(reader, roi_profile, load_roi_profiles(roi_config),
+                           resolve_preprocess(preprocess, load_preprocess_presets(preprocess_config)),
+                           max_batch, max_wait, max_queue, metrics)
+    classifier = ScreenshotClassifier(LocationMatcher(load_location_map(location_py)))
+    server = make_ocr_server(address, batcher, classifier, reader.version())
+    print(f"[*] OCR service on http://{address} (Ctrl+C to stop)")
+    logging.info(f"OCR service on http://{address}, backend {reader.version()}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("[*] Stopped serving")
+    finally:
+        server.server_close()
+        batcher.close()
+        if report:
+            report()
+
+# === WATCH MODE ===
+class FolderWatcher:
+    """Yield batches of new or changed screenshots in a folder once their files stop changing.
+
+    Subfolders and .zip/.tar archives are watched like ImageIndex reads them: a settled archive
+    yields all its screenshots, with the same nested stems. Uses watchdog (inotify, FSEvents,
+    ReadDirectoryChangesW) when it is installed and falls back to polling the tree with os.scandir.
+    """
+
+    def __init__(self, folder: str, known: Optional[ImageIndex] = None,
+                 interval: float = 0.5, settle: float = 1.0, use_watchdog: bool = True):
+        self.folder = folder
+        self.interval = interval
+        self.settle = settle
+        self.seen = {}
+        for entry in known if known is not None else ():
+            archive, member = archive_member(entry.path)
+            if member is None:
+                self.seen[entry.path] = (entry.size, entry.mtime_ns)
+            elif archive not in self.seen:
+                try:
+                    st = os.stat(archive)
+                    self.seen[archive] = (st.st_size, st.st_mtime_ns)
+                except OSError:
+                    pass
+        self.pending = {}  # path -> (size, mtime_ns, since)
+        self.dirty = set()
+        self.lock = threading.Lock()
+        self.observer = None
+        if use_watchdog:
+            self._start_watchdog()
+        if self.observer is None:
+            logging.info(f"Watching {folder} by polling every {interval}s")
+
+    def _start_watchdog(self):
         try:
-            shutil.copy(image_path, os.path.join(output_path, new_name))
-            print(f"[✔] {action_type.capitalize()} → {new_name} → {output_path}")
-            logging.info(f"[+] {action_type.capitalize()} -> {new_name} -> {output_path}")
-        except Exception as e:
-            logging.error(f"Failed to copy {image_path} to {output_path}: {e}")
-            print(f"[!] Failed to copy {image_path} to {output_path}: {e}")
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                paths = [os.fsdecode(path) for path in (getattr(event, 'src_path', None),
+                                                         getattr(event, 'dest_path', None)) if path]
+                if event.is_directory:
+                    # a folder moved in reports no events for the files inside it
+                    paths = [os.path.join(root, name) for path in paths if os.path.isdir(path)
+                             for root, _, names in os.walk(path) for name in names]
+                with watcher.lock:
+                    watcher.dirty.update(paths)
+
+        self.observer = Observer()
+        self.observer.schedule(Handler(), self.folder, recursive=True)
+        self.observer.start()
+        logging.info(f"Watching {self.folder} with {type(self.observer).__name__}")
+
+    def _changed_paths(self):
+        if self.observer is not None:
+            with self.lock:
+                paths, self.dirty = self.dirty, set()
+            return paths
+        paths = set()
+        stack = [self.folder]
+        while stack:
+            try:
+                scan = os.scandir(stack.pop())
+            except OSError:
+                continue
+            with scan:
+                for entry in scan:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+                    if not self._wanted(entry.path):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    if self.seen.get(entry.path) != (st.st_size, st.st_mtime_ns):
+                        paths.add(entry.path)
+        return paths
+
+    @staticmethod
+    def _wanted(path: str) -> bool:
+        ext = os.path.splitext(path)[1].lower()
+        return ext in IMAGE_EXTENSIONS or ext in ARCHIVE_EXTENSIONS
+
+    def _entries(self, path: str, stat: tuple) -> list:
+        """ImageEntry list of a settled file: the screenshot, or the screenshots in an archive."""
+        rel = os.path.relpath(path, self.folder).split(os.sep)
+        stem = NESTED_STEM_SEPARATOR.join(rel[:-1] + [os.path.splitext(rel[-1])[0]])
+        if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS:
+            return [ImageEntry(stem, path, *stat)]
+        index = ImageIndex.from_entries(self.folder, [])
+        index._scan_archive(path, stem + NESTED_STEM_SEPARATOR)
+        return list(index)
+
+    def poll(self) -> list:
+        """One check: return the screenshots whose size and mtime held still for `settle` seconds."""
+        now = time.monotonic()
+        for path in self._changed_paths():
+            if self._wanted(path):
+                self.pending.setdefault(path, (None, None, now))
+        ready = []
+        for path, (size, mtime_ns, since) in list(self.pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self.pending[path]  # deleted or renamed away
+                continue
+            stat = (st.st_size, st.st_mtime_ns)
+            if stat != (size, mtime_ns):
+                self.pending[path] = (*stat, now)  # still being written
+                continue
+            if self.seen.get(path) == stat:
+                del self.pending[path]  # event without a content change
+                continue
+            if now - since < self.settle:
+                continue
+            try:
+                with open(path, 'rb'):
+                    pass  # the game may still hold it open on Windows
+            except OSError:
+                continue
+            del self.pending[path]
+            self.seen[path] = stat
+            ready.extend(self._entries(path, stat))
+        return ready
+
+    def __iter__(self):
+        while True:
+            ready = self.poll()
+            if ready:
+                yield ready
+            time.sleep(self.interval)
+
+    def close(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+
+def watch_folder(input_dir: str, output_texts: str, output_images: str, location_py: str,
+                 ocr_options: dict, sort_options: dict, interval: float = 0.5, settle: float = 1.0,
+                 metrics: Optional[RunMetrics] = None, report=None):
+    """Keep the OCR backend warm and OCR -> classify -> place every screenshot that appears in input_dir.
+
+    metrics accumulate over the whole session; report() is called after every batch. The OCR store,
+    cache, sort manifest and classifier stay open for the session, so a batch costs its own
+    screenshots rather than a reload of everything sorted so far.
+    """
+    metrics = metrics if metrics is not None else RunMetrics()
+    ocr_options = dict(ocr_options, metrics=metrics)
+    sort_options = dict(sort_options, metrics=metrics)
+    reader = create_backend(ocr_options.get('ocr_backend', 'easyocr'), **(ocr_options.get('backend_options') or {})).load()
+    images = ImageIndex(input_dir)
+    ocr_images(input_dir, output_texts, images=images, reader=reader, **ocr_options)
+    process_files(output_texts, input_dir, output_images, location_py, images=images, **sort_options)
+    if report:
+        report()
+    location_map = load_location_map(location_py)
+    store = OcrStore(output_texts) if sort_options.get('text_format', 'jsonl') != 'txt' else None
+    cache_path = ocr_options.get('cache_path', DEFAULT_CACHE_PATH)
+    cache = OcrCache(cache_path, ocr_options.get('cache_max_size')) if cache_path else None
+    manifest = SortManifest(output_images, rules_fingerprint(
+        location_map, sort_options.get('min_confidence', DEFAULT_MIN_CONFIDENCE), sort_options.get('dedupe', True)))
+    classifier = ScreenshotClassifier(LocationMatcher(location_map))
+    watcher = FolderWatcher(input_dir, known=images, interval=interval, settle=settle)
+    print(f"[*] Watching {input_dir} (Ctrl+C to stop)")
+    logging.info(f"Watching {input_dir}")
+    try:
+        for batch in watcher:
+            started = time.perf_counter()
+            batch_index = ImageIndex.from_entries(input_dir, batch)
+            ocr_images(input_dir, output_texts, images=batch_index, reader=reader, store=store, cache=cache,
+                       **ocr_options)
+            process_files(output_texts, input_dir, output_images, location_py, images=batch_index,
+                          stems=set(batch_index.entries), store=store, manifest=manifest, classifier=classifier,
+                          **sort_options)
+            logging.info(f"Processed {len(batch)} new screenshot(s) in {time.perf_counter() - started:.2f}s")
+            if report:
+                report()
+    except KeyboardInterrupt:
+        print("[*] Stopped watching")
+    finally:
+        watcher.close()
+        manifest.save()
+        if store is not None:
+            store.close()
+        if cache is not None:
+            cache.close()
 
 def main():
     parser = argparse.ArgumentParser(description="OCR and sort GTA screenshots.")
-    parser.add_argument('--input-dir', default='images', help='Input images directory')
+    parser.add_argument('--input-dir', default='images',
+                        help='Input images directory (subfolders and .zip/.tar archives in it are read too) '
+                             'or a single .zip/.tar archive')
     parser.add_argument('--output-texts', default='output_texts', help='Output texts directory')
     parser.add_argument('--output-images', default='output_images', help='Output images directory')
     parser.add_argument('--location-py', default='gta-locations.py', help='Location path')
     parser.add_argument('--force-ocr', action='store_true', help='Force OCR even if text files exist')
+    parser.add_argument('--roi-profile', default='auto',
+                        help="ROI profile name, 'auto' to pick by image size, or 'off' to OCR the full image")
+    parser.add_argument('--roi-config', default=None, help='JSON file with extra/overriding ROI profiles')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='OCR worker processes, each loading the model once (default: 1)')
+    parser.add_argument('--cache-path', default=DEFAULT_CACHE_PATH, help='SQLite OCR cache file')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the OCR cache (skip by existing text files)')
+    parser.add_argument('--cache-max-size', type=float, default=None,
+                        help='Max OCR cache size in MB; least recently used entries are evicted')
+    parser.add_argument('--prune-cache', action='store_true',
+                        help='Prune the OCR cache (--cache-max-size, --cache-max-age) and exit')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Parallel jobs for sorting: classifier processes and copy threads (default: 1)')
+    parser.add_argument('--force-sort', action='store_true',
+                        help='Reclassify and re-place every text, ignoring the sort manifest')
+    parser.add_argument('--link-mode', choices=LINK_MODES, default='copy',
+                        help='How sorted screenshots are placed; links fall back to copy across filesystems')
+    parser.add_argument('--cache-max-age', type=float, default=None,
+                        help='With --prune-cache: drop entries unused for this many days')
+    parser.add_argument('--skip-ocr', '--sort-only', dest='skip_ocr', action='store_true',
+                        help='Only sort existing OCR texts; never loads the OCR engine')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running: OCR and sort new screenshots as they appear in the input directory')
+    parser.add_argument('--watch-interval', type=float, default=0.5, help='Watch mode check interval in seconds')
+    parser.add_argument('--watch-settle', type=float, default=1.0,
+                        help='Watch mode: seconds a file must stay unchanged before it is processed')
+    parser.add_argument('--preprocess', default=DEFAULT_PREPROCESS,
+                        help=f"Preprocessing preset for ROI crops ({', '.join(PREPROCESS_PRESETS)}, or one from --preprocess-config)")
+    parser.add_argument('--preprocess-config', default=None, help='JSON file with extra/overriding preprocessing presets')
+    parser.add_argument('--ocr-backend', choices=OCR_BACKENDS, default='easyocr',
+                        help='OCR engine; cascade runs Tesseract first and easyocr only when no action/date is found')
+    parser.add_argument('--tesseract-cmd', default=None, help='Path to the tesseract executable if not in PATH')
+    parser.add_argument('--ocr-server', default=None,
+                        help=f'URL of a --serve instance for --ocr-backend remote (default http://{DEFAULT_SERVE_ADDRESS})')
+    parser.add_argument('--onnx-detector', default=None,
+                        help='Run the easyocr text detector on ONNX Runtime, exporting it to this .onnx file if missing')
+    parser.add_argument('--early-exit', action='store_true',
+                        help='OCR regions in priority order (chat, location, clock) and stop once action, date '
+                             'and location are found above --min-confidence')
+    parser.add_argument('--min-confidence', type=float, default=DEFAULT_MIN_CONFIDENCE,
+                        help='OCR confidence (0-1) below which sorted screenshots go to output_images/review '
+                             '(default 0: off)')
+    parser.add_argument('--text-format', choices=TEXT_FORMATS, default='jsonl',
+                        help='OCR output: one ocr.jsonl store, per-image .txt files, or both')
+    parser.add_argument('--near-duplicate-distance', type=int, default=DEFAULT_NEAR_DUPLICATE_DISTANCE,
+                        help=f'OCR only one of near-identical screenshots: max differing bits of the '
+                             f'{PHASH_BITS}-bit perceptual hash (0 = visually identical, -1 = off, the default)')
+    parser.add_argument('--keep-duplicates', action='store_true',
+                        help='Sort repeat screenshots of one event (action, name, timestamp) normally '
+                             'instead of into output_images/duplicates')
+    parser.add_argument('--serve', nargs='?', const=DEFAULT_SERVE_ADDRESS, default=None, metavar='HOST:PORT',
+                        help=f'Run the local OCR HTTP service (default {DEFAULT_SERVE_ADDRESS}) instead of sorting')
+    parser.add_argument('--batch-size', type=int, default=8, help='--serve: max screenshots per OCR batch')
+    parser.add_argument('--batch-wait', type=float, default=50,
+                        help='--serve: ms to wait for more requests before running a batch')
+    parser.add_argument('--max-queue', type=int, default=32,
+                        help='--serve: waiting requests before new ones get HTTP 503')
+    parser.add_argument('--max-memory', type=float, default=None, metavar='MB',
+                        help='Feed the OCR workers one image at a time while this process and its workers '
+                             'use more than this many MB (needs psutil outside Linux)')
+    parser.add_argument('--output-archive', default=None,
+                        help='Also pack the sorted screenshots into this .zip or .tar after sorting')
+    parser.add_argument('--journal', default=JOURNAL_PATH,
+                        help="Run journal recording each finished file, for --resume ('' to skip)")
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue the interrupted run from the journal with its options, '
+                             'skipping the files it already finished')
+    parser.add_argument('--run-summary', default='run-summary.json',
+                        help="JSON file with this run's counters, stage latencies and slowest files ('' to skip)")
+    parser.add_argument('--prometheus-textfile', default=None,
+                        help='Also write the run metrics in Prometheus textfile-collector format to this .prom file')
     args = parser.parse_args()
+    if args.output_archive and not is_archive(args.output_archive):
+        parser.error("--output-archive must end in .zip or .tar")
+    if args.watch and is_archive(args.input_dir):
+        parser.error("--watch needs an input folder, not an archive")
 
-    ocr_images(args.input_dir, args.output_texts, force=args.force_ocr)
-    process_files(args.output_texts, args.input_dir, args.output_images, args.location_py)
+    if args.prune_cache:
+        cache = OcrCache(args.cache_path)
+        removed = cache.prune(
+            int(args.cache_max_size * 1024 * 1024) if args.cache_max_size is not None else None,
+            args.cache_max_age,
+        )
+        cache.close()
+        print(f"Pruned {removed} entries from {args.cache_path}")
+        logging.info(f"Pruned {removed} entries from {args.cache_path}")
+        return
+
+    options = PipelineOptions(
+        input_dir=args.input_dir, output_texts=args.output_texts, output_images=args.output_images,
+        location_py=args.location_py, skip_ocr=args.skip_ocr, force_ocr=args.force_ocr, force_sort=args.force_sort,
+        workers=args.workers, jobs=args.jobs, link_mode=args.link_mode, text_format=args.text_format,
+        min_confidence=args.min_confidence, dedupe=not args.keep_duplicates, run_summary=args.run_summary,
+        prometheus_textfile=args.prometheus_textfile, output_archive=args.output_archive,
+        journal=args.journal or None,
+        ocr=dict(roi_profile=args.roi_profile, roi_config=args.roi_config,
+                 near_duplicate_distance=args.near_duplicate_distance, max_memory=args.max_memory,
+                 preprocess=args.preprocess, preprocess_config=args.preprocess_config,
+                 ocr_backend=args.ocr_backend, early_exit=args.early_exit,
+                 backend_options=dict(tesseract_cmd=args.tesseract_cmd, onnx_detector=args.onnx_detector,
+                                      server_url=args.ocr_server),
+                 cache_path=None if args.no_cache else args.cache_path, cache_max_size=args.cache_max_size),
+    )
+    if args.serve:
+        metrics = RunMetrics()
+        serve(args.serve, args.location_py, args.ocr_backend, options.ocr['backend_options'],
+              args.roi_profile, args.roi_config, args.preprocess, args.preprocess_config,
+              args.batch_size, args.batch_wait / 1000, args.max_queue, metrics=metrics,
+              report=lambda: metrics.write_reports(args.run_summary, args.prometheus_textfile))
+        return
+    if args.watch:
+        metrics = RunMetrics()
+        watch_folder(args.input_dir, args.output_texts, args.output_images, args.location_py,
+                     dict(options.ocr_options(), force=args.force_ocr), options.sort_options(),
+                     interval=args.watch_interval, settle=args.watch_settle, metrics=metrics,
+                     report=lambda: metrics.write_reports(args.run_summary, args.prometheus_textfile))
+        return
+    run_pipeline(options, resume=args.resume)
 
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
     if len(sys.argv) == 1:
         # --- TKINTER GUI ---
         import tkinter as tk
@@ -220,7 +3052,7 @@ if __name__ == "__main__":
             def __init__(self, root):
                 self.root = root
                 root.title("GTA OCR Sorter")
-                root.geometry("500x470")
+                root.geometry("500x600")
                 
                 # Input dir
                 tk.Label(root, text="Input images directory:").pack(anchor='w', padx=10, pady=(10,0))
@@ -234,6 +3066,23 @@ if __name__ == "__main__":
                 self.force_ocr = tk.Checkbutton(root, text="Force OCR (reprocess all images)", variable=self.force_ocr_var)
                 self.force_ocr.pack(anchor='w', padx=10, pady=(10,0))
                 
+                # OCR workers
+                workers_row = tk.Frame(root)
+                workers_row.pack(anchor='w', padx=10, pady=(5,0))
+                tk.Label(workers_row, text="Workers:").pack(side='left')
+                self.workers_var = tk.StringVar(value="1")
+                tk.Spinbox(workers_row, from_=1, to=os.cpu_count() or 1, width=5, textvariable=self.workers_var).pack(side='left', padx=5)
+                
+                # Output mode
+                tk.Label(workers_row, text="Output:").pack(side='left', padx=(15,0))
+                self.link_mode_var = tk.StringVar(value="copy")
+                tk.OptionMenu(workers_row, self.link_mode_var, *LINK_MODES).pack(side='left', padx=5)
+                
+                # Remote OCR (python ocr-merged.py --serve on this or another machine)
+                tk.Label(root, text="OCR server URL (optional, e.g. http://127.0.0.1:8765):").pack(anchor='w', padx=10, pady=(5,0))
+                self.server_url = tk.Entry(root, width=50)
+                self.server_url.pack(padx=10, anchor='w')
+                
                 # Progress bar
                 from tkinter import ttk
                 self.progress = ttk.Progressbar(root, orient='horizontal', length=480, mode='determinate')
@@ -246,12 +3095,20 @@ if __name__ == "__main__":
                 
                 # Start button
                 self.start_btn = tk.Button(root, text="START", bg="green", fg="white", font=("Arial", 18, "bold"), command=self.run_script)
-                self.start_btn.pack(pady=10, fill='x', padx=10)
+                self.start_btn.pack(pady=(10,0), fill='x', padx=10)
+                
+                # Stop button
+                self.stop_btn = tk.Button(root, text="STOP", bg="#aa4444", fg="white", font=("Arial", 12, "bold"), command=self.stop_script, state='disabled')
+                self.stop_btn.pack(pady=(5,10), fill='x', padx=10)
+                self.cancel = None
                 
                 # Count Points button
                 self.points_btn = tk.Button(root, text="Count Points and make a report", bg="#4444aa", fg="white", font=("Arial", 14, "bold"), command=self.show_points_report)
                 self.points_btn.pack(pady=5, fill='x', padx=10)
                 
+                # Load the OCR model while the user picks options
+                self.warm_reader = WarmReader()
+                
             def browse_input(self):
                 d = filedialog.askdirectory()
                 if d:
@@ -267,149 +3124,73 @@ if __name__ == "__main__":
                     self.progress['maximum'] = max_value
                 self.progress['value'] = value
                 self.root.update_idletasks()
+            def stop_script(self):
+                if self.cancel is not None:
+                    self.cancel.set()
+                    self.log("Stopping after the current file...")
             def run_script(self):
-                import threading
+                self.log_text.config(state='normal')
+                self.log_text.delete('1.0', 'end')
+                self.log_text.config(state='disabled')
+                self.set_progress(0, 1)
+                # Mirror log records in the window, next to app.log
+                class GuiLogHandler(logging.Handler):
+                    def emit(inner_self, record):
+                        msg = inner_self.format(record)
+                        self.root.after(0, self.log, msg)
+                for h in logging.root.handlers[:]:
+                    if type(h).__name__ == 'GuiLogHandler':
+                        logging.root.removeHandler(h)
+                handler = GuiLogHandler()
+                handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+                logging.root.addHandler(handler)
+                workers = int(self.workers_var.get())
+                # Use default values for hidden options
+                options = PipelineOptions(
+                    input_dir=self.input_dir.get(),
+                    force_ocr=self.force_ocr_var.get(),
+                    workers=workers,
+                    jobs=workers,
+                    link_mode=self.link_mode_var.get(),
+                )
+                reader = self.warm_reader if workers <= 1 else None
+                server_url = self.server_url.get().strip()
+                if server_url:
+                    options.ocr = dict(ocr_backend='remote', backend_options=dict(server_url=server_url))
+                    reader = None
+                resume = RunJournal(JOURNAL_PATH).interrupted and messagebox.askyesno(
+                    "Resume", "The last run was interrupted. Continue where it stopped?")
+                self.cancel = threading.Event()
+                self.start_btn.config(state='disabled')
+                self.stop_btn.config(state='normal')
+                def progress(stage, done, total):
+                    self.root.after(0, self.set_progress, done, max(total, 1))
+                def finished(title, message, error=False):
+                    self.start_btn.config(state='normal')
+                    self.stop_btn.config(state='disabled')
+                    self.set_progress(0, 1)
+                    (messagebox.showerror if error else messagebox.showinfo)(title, message)
                 def task():
                     try:
-                        self.log_text.config(state='normal')
-                        self.log_text.delete('1.0', 'end')
-                        self.log_text.config(state='disabled')
-                        self.set_progress(0, 1)
-                        # Patch logging
-                        class GuiLogHandler(logging.Handler):
-                            def emit(inner_self, record):
-                                msg = inner_self.format(record)
-                                self.root.after(0, self.log, msg)
-                        for h in logging.root.handlers[:]:
-                            logging.root.removeHandler(h)
-                        handler = GuiLogHandler()
-                        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-                        logging.root.addHandler(handler)
-                        logging.root.setLevel(logging.INFO)
-                        # Use default values for hidden options
-                        input_dir = self.input_dir.get()
-                        output_texts = "output_texts"
-                        output_images = "output_images"
-                        location_py = "gta-locations.py"
-                        force = self.force_ocr_var.get()
-                        image_paths = glob(os.path.join(input_dir, '*.png')) + glob(os.path.join(input_dir, '*.jpg'))
-                        total_images = len(image_paths)
-                        self.set_progress(0, max(total_images, 1))
-                        # Wrap ocr_images and process_files for progress
-                        def ocr_images_gui(*args, **kwargs):
-                            reader = easyocr.Reader(['en', 'ru'])
-                            for idx, image_path in enumerate(image_paths):
-                                image_name = os.path.splitext(os.path.basename(image_path))[0]
-                                txt_path = os.path.join(output_texts, f"{image_name}.txt")
-                                if not force and os.path.exists(txt_path):
-                                    logging.info(f"Skipping already processed: {image_path}")
-                                    self.set_progress(idx+1)
-                                    continue
-                                try:
-                                    results = reader.readtext(image_path)
-                                    lines = [text for _, text, _ in results]
-                                    with open(txt_path, 'w', encoding='utf-8') as f:
-                                        f.write('\n'.join(lines))
-                                    logging.info(f"Saved text from {image_path} to {txt_path}")
-                                except Exception as e:
-                                    logging.error(f"OCR failed for {image_path}: {e}")
-                                self.set_progress(idx+1)
-                        def process_files_gui(*args, **kwargs):
-                            txt_files = [f for f in os.listdir(output_texts) if f.lower().endswith('.txt')]
-                            total_txt = len(txt_files)
-                            self.set_progress(0, max(total_txt, 1))
-                            for idx, txt_file in enumerate(txt_files):
-                                txt_path = os.path.join(output_texts, txt_file)
-                                try:
-                                    with open(txt_path, "r", encoding="utf-8") as f:
-                                        content = f.read()
-                                except Exception as e:
-                                    logging.error(f"Failed to read {txt_path}: {e}")
-                                    self.set_progress(idx+1)
-                                    continue
-                                action_type, person_id = detect_action(content)
-                                dt_full, time_of_day = extract_datetime(content)
-                                if not action_type or not dt_full:
-                                    base_name = os.path.splitext(txt_file)[0]
-                                    image_path = find_image(base_name, input_dir)
-                                    if image_path:
-                                        various_path = os.path.join(output_images, 'various')
-                                        os.makedirs(various_path, exist_ok=True)
-                                        new_name = f"Various - {base_name}{os.path.splitext(image_path)[1]}"
-                                        try:
-                                            shutil.copy(image_path, os.path.join(various_path, new_name))
-                                            logging.info(f"[~] No action/date: {new_name} -> {various_path}")
-                                        except Exception as e:
-                                            logging.error(f"Failed to copy {image_path} to {various_path}: {e}")
-                                    else:
-                                        logging.warning(f"[ ] Skipped (no action or date): {txt_file}")
-                                    self.set_progress(idx+1)
-                                    continue
-                                output_path = None
-                                reanimation_location_map = load_location_map(location_py)
-                                if action_type == "reanimation":
-                                    loc_name, city_flag = detect_reanimation_location(content, reanimation_location_map)
-                                    if not loc_name:
-                                        logging.warning(f"[!] Location is not found for reanimation: {txt_file}")
-                                        self.set_progress(idx+1)
-                                        continue
-                                    output_path = os.path.join(output_images, action_type, city_flag, time_of_day)
-                                else:
-                                    simple_loc = detect_simple_location(content)
-                                    if not simple_loc:
-                                        logging.warning(f"[!] Location is not found for {action_type}: {txt_file}")
-                                        self.set_progress(idx+1)
-                                        continue
-                                    output_path = os.path.join(output_images, action_type, simple_loc)
-                                base_name = os.path.splitext(txt_file)[0]
-                                image_path = find_image(base_name, input_dir)
-                                if not image_path:
-                                    logging.warning(f"[!] Image is not found: {txt_file}")
-                                    self.set_progress(idx+1)
-                                    continue
-                                os.makedirs(output_path, exist_ok=True)
-                                safe_date = safe_filename(dt_full)
-                                new_name = f"{action_type.capitalize()} - {safe_date}"
-                                if person_id:
-                                    new_name += f" - {person_id}"
-                                new_name += os.path.splitext(image_path)[1]
-                                try:
-                                    shutil.copy(image_path, os.path.join(output_path, new_name))
-                                    logging.info(f"[+] {action_type.capitalize()} -> {new_name} -> {output_path}")
-                                except Exception as e:
-                                    logging.error(f"Failed to copy {image_path} to {output_path}: {e}")
-                                self.set_progress(idx+1)
-                        ocr_images_gui()
-                        process_files_gui()
-                        self.set_progress(0, 1)
-                        messagebox.showinfo("Done", "Processing complete!")
+                        run_pipeline(options, progress=progress, cancel=self.cancel, reader=reader, resume=resume)
+                        self.root.after(0, finished, "Done", "Processing complete!")
+                    except Cancelled:
+                        self.root.after(0, finished, "Stopped", "Processing stopped. Run again to continue where it stopped.")
                     except Exception as e:
-                        messagebox.showerror("Error", str(e))
-                threading.Thread(target=task).start()
+                        self.root.after(0, finished, "Error", str(e), True)
+                threading.Thread(target=task, daemon=True).start()
         
             def show_points_report(self):
-                import subprocess
                 import tkinter as tk
                 from tkinter import scrolledtext, Toplevel
                 try:
-                    # Run count-points.py and capture output
-                    result = subprocess.run(
-                        [sys.executable, 'count-points.py', '--target-score', '500'],
-                        capture_output=True, text=True, check=True
-                    )
-                    # Always read report.txt for the report
-                    try:
-                        with open('report.txt', 'r', encoding='utf-8') as f:
-                            output = f.read()
-                    except Exception as e:
-                        output = f"Could not read report.txt: {e}"
-                except subprocess.CalledProcessError as e:
-                    try:
-                        with open('report.txt', 'r', encoding='utf-8') as f:
-                            output = f.read()
-                    except Exception as e2:
-                        output = (e.stdout or '') + '\n' + (e.stderr or '') + f"\nCould not read report.txt: {e2}"
+                    scoring = load_py_module(resource_path('count-points.py'))
+                    report = scoring.score('output_images', target_total_score=500)
+                    plan = scoring.plan_deletions(report)
+                    scoring.save_deletion_list(plan, 'deletion-list.txt')
+                    output = scoring.write_report(report, 'report.txt', plan)
                 except Exception as e:
+                    logging.error(f"Failed to count points: {e}")
                     output = str(e)
                 # Show in new window
                 win = Toplevel(self.root)
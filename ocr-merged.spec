@@ -5,7 +5,7 @@ a = Analysis(
     ['ocr-merged.py'],
     pathex=[],
     binaries=[],
-    datas=[],
+    datas=[('count-points.py', '.')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},